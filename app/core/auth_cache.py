@@ -0,0 +1,106 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from app.core import invalidation
+from app.core.config import settings
+
+APIKEY_SCOPE = "apikey"
+
+_MISSING = object()
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class TTLCache:
+    """
+    Small LRU cache with per-entry expiry. None is a valid cached value,
+    used for negative caching.
+    """
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+    
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return _MISSING
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats["misses"] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.stats["hits" if value is not None else "negative_hits"] += 1
+            return value
+    
+    def set(self, key, value, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def evict(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries)}
+
+
+# API key digest -> user snapshot, or None for tokens that are not API keys.
+api_key_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES)
+# User id -> user snapshot, for JWT callers.
+user_cache = TTLCache(settings.AUTH_CACHE_MAX_ENTRIES)
+
+
+def snapshot_user(user):
+    """
+    Detached copy of the columns request handlers read, safe to share
+    between requests and sessions.
+    """
+    from app.models.user import User
+    return User(id=user.id, email=user.email, created_at=user.created_at)
+
+
+def get_api_key_user(digest: str):
+    return api_key_cache.get(digest)
+
+
+def set_api_key_user(digest: str, user) -> None:
+    if user is None:
+        api_key_cache.set(digest, None, settings.AUTH_NEGATIVE_CACHE_TTL_SECONDS)
+    else:
+        api_key_cache.set(digest, snapshot_user(user), settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def get_user(user_id: int):
+    return user_cache.get(user_id)
+
+
+def set_user(user) -> None:
+    user_cache.set(user.id, snapshot_user(user), settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def revoke_api_key(db, digest: str) -> None:
+    """
+    Evict an API key here and on every replica. Call before committing
+    the session that deletes it.
+    """
+    invalidation.publish(db, APIKEY_SCOPE, digest)
+
+
+invalidation.subscribe(APIKEY_SCOPE, api_key_cache.evict)
+
+
+def is_missing(value) -> bool:
+    return value is _MISSING
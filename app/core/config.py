@@ -3,19 +3,131 @@ from pydantic_settings import BaseSettings
 from functools import lru_cache
 
 
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use: the affinity mask, capped by a
+    cgroup CPU quota. os.cpu_count() reports the host inside containers.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = f.read().strip()
+        except OSError:
+            quota, period = "max", "1"
+    if quota not in ("max", "-1"):
+        cpus = min(cpus, max(1, int(quota) // int(period)))
+    return max(1, cpus)
+
+
 class Settings(BaseSettings):
     DATABASE_URL: str = os.environ.get("DATABASE_URL", "")
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 30
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0
+    DB_POOL_RECYCLE_SECONDS: int = 300
+    DB_CREATE_ON_STARTUP: bool = True
+    
+    WARMUP_RENDER: bool = True
+    WARMUP_TEMPLATES: int = 20
     
     AWS_ACCESS_KEY_ID: str = os.environ.get("AWS_ACCESS_KEY_ID", "")
     AWS_SECRET_ACCESS_KEY: str = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
     AWS_REGION: str = os.environ.get("AWS_REGION", "us-east-1")
     S3_BUCKET: str = os.environ.get("S3_BUCKET", "pdf-templates")
+    S3_ENDPOINT_URL: str = os.environ.get("S3_ENDPOINT_URL", "")
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    S3_MAX_ATTEMPTS: int = 4
+    S3_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    S3_READ_TIMEOUT_SECONDS: float = 30.0
     
     SECRET_KEY: str = os.environ.get("SESSION_SECRET", "super-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+    
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 60.0
+    AUTH_NEGATIVE_CACHE_TTL_SECONDS: float = 10.0
+    
+    JINJA_CACHE_SIZE: int = 256
+    JINJA_BYTECODE_CACHE: str = "disk"
+    JINJA_BYTECODE_CACHE_DIR: str = "local_storage/jinja_bytecode"
+    
+    TEMPLATE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    TEMPLATE_CACHE_TTL_SECONDS: float = 60.0
+    CACHE_INVALIDATION_BACKEND: str = "db"
+    CACHE_INVALIDATION_FILE: str = "local_storage/cache_invalidations.log"
+    CACHE_INVALIDATION_POLL_SECONDS: float = 2.0
+    
+    RENDER_WORKERS: int = available_cpus()
+    RENDER_QUEUE_SIZE: int = 32
+    RENDER_TIMEOUT_SECONDS: float = 120.0
+    BATCH_MAX_ITEMS: int = 1000
+    
+    SHARED_STYLES_DIR: str = "app/shared_styles"
+    RENDER_IMAGE_DPI: int = 300
+    RENDER_JPEG_QUALITY: int = 85
+    RENDER_IMAGE_MAX_INCHES: float = 8.5
+    RENDER_IMAGE_CACHE_ENTRIES: int = 256
+    RENDER_IMAGE_DOWNSAMPLE_CACHE_BYTES: int = 64 * 1024 * 1024
+    
+    ASSET_ALLOWED_HOSTS: str = "*"
+    ASSET_STORAGE_PREFIX: str = "assets/"
+    ASSET_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024
+    ASSET_CACHE_DISK_BYTES: int = 512 * 1024 * 1024
+    ASSET_CACHE_TTL_SECONDS: float = 3600.0
+    ASSET_NEGATIVE_CACHE_TTL_SECONDS: float = 60.0
+    ASSET_FETCH_TIMEOUT_SECONDS: float = 5.0
+    ASSET_FETCH_BUDGET_SECONDS: float = 10.0
+    ASSET_MAX_BYTES: int = 10 * 1024 * 1024
+    
+    RENDER_LOG_BUFFER_SIZE: int = 50000
+    RENDER_LOG_FLUSH_SIZE: int = 500
+    RENDER_LOG_FLUSH_SECONDS: float = 2.0
+    RENDER_LOG_OVERFLOW_POLICY: str = "spill"
+    RENDER_LOG_SPILL_PATH: str = "local_storage/renderlog_spill.jsonl"
+    
+    RENDERLOG_PARTITION_MONTHS_AHEAD: int = 2
+    RENDERLOG_RETENTION_MONTHS: int = 12
+    RENDERLOG_ARCHIVE: bool = True
+    RENDERLOG_MAINTENANCE_INTERVAL_SECONDS: float = 6 * 3600
+    
+    RENDER_OUTPUT_TTL_SECONDS: int = 24 * 3600
+    RENDER_OUTPUT_RETENTION_INTERVAL_SECONDS: float = 600.0
+    
+    PDF_CACHE_BACKEND: str = "none"
+    PDF_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    
+    RASTER_MAX_MEMORY_MB: int = 256
+    RASTER_CONCURRENCY: int = 2
+    RASTER_THREADS: int = available_cpus()
+    RASTER_SAVE_THREADS: int = available_cpus()
+    IMAGE_MAX_AGE_HOURS: int = 24
+    IMAGE_DISK_QUOTA_MB: int = 2048
+    IMAGE_RETENTION_INTERVAL_SECONDS: float = 300.0
+    
+    JOB_POLL_SECONDS: float = 1.0
+    JOB_HEARTBEAT_SECONDS: float = 15.0
+    JOB_STALE_SECONDS: int = 120
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RESULT_TTL_HOURS: int = 24
+    JOB_CALLBACK_TIMEOUT_SECONDS: float = 10.0
+    JOB_CALLBACK_ALLOWED_HOSTS: str = "*"
+    
     class Config:
         env_file = ".env"
         extra = "allow"
@@ -1,17 +1,46 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from app.core.config import settings
 
 DATABASE_URL = os.environ.get("DATABASE_URL", "")
 
-engine = create_engine(
-    DATABASE_URL,
+
+def _async_database_url(url: str) -> str:
+    """
+    asyncpg flavour of DATABASE_URL; libpq's sslmode becomes asyncpg's ssl.
+    """
+    if not url:
+        return url
+    parsed = make_url(url).set(drivername="postgresql+asyncpg")
+    query = dict(parsed.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return parsed.set(query=query).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+_pool_options = dict(
     pool_pre_ping=True,
-    pool_recycle=300
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS
 )
 
+engine = create_engine(DATABASE_URL, **_pool_options)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Used by async routes and dependencies so database I/O never blocks the
+# event loop. Objects stay readable after commit for response models.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -21,3 +50,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_pool_stats() -> dict:
+    stats = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        stats[name] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": settings.DB_MAX_OVERFLOW
+        }
+    return stats
@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from sqlalchemy.orm import Session
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_handlers: dict[str, list[Callable[[str], None]]] = {}
+
+
+def subscribe(scope: str, handler: Callable[[str], None]) -> None:
+    """
+    Register a handler called with the key of every invalidation in scope,
+    whether it was published by this process or by another replica.
+    """
+    _handlers.setdefault(scope, []).append(handler)
+
+
+def _dispatch(scope: str, key: str) -> None:
+    for handler in _handlers.get(scope, []):
+        try:
+            handler(key)
+        except Exception as e:
+            logger.error(f"Invalidation handler for {scope} failed: {str(e)}")
+
+
+class DBInvalidationBus:
+    """
+    Shares invalidations through the cache_invalidations table, so every
+    replica connected to the same database sees them.
+    """
+    
+    def __init__(self):
+        self._last_id = None
+        self._prune_executor = None
+    
+    def publish(self, db: Session, scope: str, key: str) -> None:
+        from app.models.cache_invalidation import CacheInvalidation
+        db.add(CacheInvalidation(scope=scope, key=key))
+    
+    def poll(self, db: Session) -> list[tuple[str, str]]:
+        from sqlalchemy import func
+        from app.models.cache_invalidation import CacheInvalidation
+        
+        if self._last_id is None:
+            self._last_id = db.query(func.max(CacheInvalidation.id)).scalar() or 0
+            return []
+        
+        rows = db.query(CacheInvalidation).filter(
+            CacheInvalidation.id > self._last_id
+        ).order_by(CacheInvalidation.id).all()
+        if rows:
+            self._last_id = rows[-1].id
+        return [(row.scope, row.key) for row in rows]
+    
+    def prune(self, db: Session, max_age_hours: int = 24) -> None:
+        """
+        Delete old events in the background. poll() may run on the event
+        loop (via run_sync) and inside the caller's transaction, so the
+        delete gets its own session on a separate thread.
+        """
+        if self._prune_executor is None:
+            self._prune_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="invalidation-prune")
+        self._prune_executor.submit(self._prune, max_age_hours)
+    
+    def _prune(self, max_age_hours: int) -> None:
+        from app.core.database import SessionLocal
+        from app.models.cache_invalidation import CacheInvalidation
+        
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+        prune_db = SessionLocal()
+        try:
+            prune_db.query(CacheInvalidation).filter(
+                CacheInvalidation.created_at < cutoff
+            ).delete(synchronize_session=False)
+            prune_db.commit()
+        except Exception as e:
+            logger.error(f"Pruning cache invalidations failed: {str(e)}")
+        finally:
+            prune_db.close()
+
+
+class FileInvalidationBus:
+    """
+    Append-only file stand-in for the database bus, for tests and
+    single-host deployments sharing a volume.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._offset = None
+        self._lock = threading.Lock()
+    
+    def publish(self, db: Session | None, scope: str, key: str) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{scope}\t{key}\n")
+    
+    def poll(self, db: Session | None) -> list[tuple[str, str]]:
+        with self._lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    if self._offset is None:
+                        f.seek(0, os.SEEK_END)
+                        self._offset = f.tell()
+                        return []
+                    f.seek(self._offset)
+                    lines = f.readlines()
+                    self._offset = f.tell()
+            except FileNotFoundError:
+                self._offset = 0
+                return []
+        
+        events = []
+        for line in lines:
+            scope, _, key = line.rstrip("\n").partition("\t")
+            if scope:
+                events.append((scope, key))
+        return events
+    
+    def prune(self, db: Session | None, max_age_hours: int = 24) -> None:
+        pass
+
+
+def _create_bus():
+    backend = settings.CACHE_INVALIDATION_BACKEND
+    if backend == "db":
+        return DBInvalidationBus()
+    if backend == "file":
+        return FileInvalidationBus(settings.CACHE_INVALIDATION_FILE)
+    return None
+
+
+bus = _create_bus()
+_poll_lock = threading.Lock()
+_last_poll = 0.0
+_last_prune = 0.0
+
+
+def publish(db: Session | None, scope: str, key) -> None:
+    """
+    Invalidate key in scope locally and announce it to other replicas.
+    With the database bus the event is committed together with db.
+    """
+    key = str(key)
+    _dispatch(scope, key)
+    if bus is not None:
+        bus.publish(db, scope, key)
+
+
+def poll(db: Session | None) -> None:
+    """
+    Apply invalidations published by other replicas. Cheap to call on every
+    request: the bus is only read once per CACHE_INVALIDATION_POLL_SECONDS.
+    """
+    global _last_poll, _last_prune
+    
+    if bus is None:
+        return
+    
+    now = time.monotonic()
+    if now - _last_poll < settings.CACHE_INVALIDATION_POLL_SECONDS:
+        return
+    if not _poll_lock.acquire(blocking=False):
+        return
+    
+    try:
+        _last_poll = now
+        for scope, key in bus.poll(db):
+            _dispatch(scope, key)
+        if now - _last_prune > 3600:
+            _last_prune = now
+            bus.prune(db)
+    except Exception as e:
+        logger.error(f"Polling cache invalidations failed: {str(e)}")
+    finally:
+        _poll_lock.release()
+
+
+async def poll_async(db) -> None:
+    """
+    poll() for an AsyncSession; the bus queries run on the async connection.
+    """
+    if bus is None or time.monotonic() - _last_poll < settings.CACHE_INVALIDATION_POLL_SECONDS:
+        return
+    await db.run_sync(poll)
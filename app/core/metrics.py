@@ -0,0 +1,155 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_collectors: list[Callable[[], list[tuple]]] = []
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+    
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+    
+    def expose(self) -> list[str]:
+        lines = super().expose()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+    
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def register_collector(collector: Callable[[], list[tuple]]) -> None:
+    """
+    Register a callback evaluated at scrape time, returning
+    (name, type, documentation, labels_dict, value) samples. Used for
+    values that already live elsewhere (queue depths, cache counters).
+    """
+    _collectors.append(collector)
+
+
+def render_latest() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.expose())
+    
+    # Samples of one metric must be contiguous in the exposition format.
+    families: dict[str, list] = {}
+    for collector in _collectors:
+        try:
+            samples = collector()
+        except Exception as e:
+            logger.error(f"Metrics collector failed: {str(e)}")
+            continue
+        for name, metric_type, documentation, labels, value in samples:
+            families.setdefault(name, [metric_type, documentation, []])[2].append((labels, value))
+    
+    for name, (metric_type, documentation, samples) in families.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    
+    return "\n".join(lines) + "\n"
+
+
+RENDER_STAGE_SECONDS = Histogram(
+    "pdfapi_render_stage_seconds",
+    "Time spent in each stage of the render pipeline",
+    ("stage", "template")
+)
+RENDERS_TOTAL = Counter("pdfapi_renders_total", "Finished renders by status", ("status",))
+RENDERS_IN_FLIGHT = Gauge("pdfapi_renders_in_flight", "Renders currently being processed", ("kind",))
+OUTPUT_BYTES_TOTAL = Counter("pdfapi_output_bytes_total", "Bytes of generated output", ("kind",))
+
+
+@contextmanager
+def timed_stage(stage: str, template=""):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        RENDER_STAGE_SECONDS.observe(time.perf_counter() - start_time, stage=stage, template=str(template))
+
+
+@contextmanager
+def in_flight(kind: str):
+    RENDERS_IN_FLIGHT.inc(kind=kind)
+    try:
+        yield
+    finally:
+        RENDERS_IN_FLIGHT.dec(kind=kind)
@@ -0,0 +1,38 @@
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Idempotent schema upgrades for databases created by older versions;
+# create_all only adds missing tables, never columns or indexes.
+MIGRATIONS = [
+    "ALTER TABLE apikeys ADD COLUMN IF NOT EXISTS key_hash VARCHAR(64)",
+    "ALTER TABLE apikeys ADD COLUMN IF NOT EXISTS key_prefix VARCHAR(8)",
+    # Hash and prefix keys stored in plaintext, then drop the plaintext.
+    "DO $$ BEGIN "
+    "IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'apikeys' AND column_name = 'key') THEN "
+    "UPDATE apikeys SET key_hash = encode(sha256(convert_to(key, 'UTF8')), 'hex') WHERE key_hash IS NULL; "
+    "UPDATE apikeys SET key_prefix = left(key, 8) WHERE key_prefix IS NULL; "
+    "ALTER TABLE apikeys DROP COLUMN key; "
+    "END IF; "
+    "END $$",
+    "ALTER TABLE apikeys ALTER COLUMN key_hash SET NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_apikeys_key_hash ON apikeys (key_hash)",
+    "ALTER TABLE renderjobs ADD COLUMN IF NOT EXISTS base_url VARCHAR(500)",
+    "ALTER TABLE renderjobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ",
+    "DROP INDEX IF EXISTS ix_renderjobs_status_created_at",
+    "CREATE INDEX IF NOT EXISTS ix_renderjobs_active_status_created_at ON renderjobs (status, created_at) "
+    "WHERE status IN ('queued', 'running')",
+]
+
+
+def run_migrations(engine) -> None:
+    from app.core.partitions import prepare_renderlogs, MAINTENANCE_LOCK_ID
+    
+    with engine.begin() as conn:
+        # Serialize replicas booting at the same time.
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+        prepare_renderlogs(conn)
+    logger.info(f"Applied {len(MIGRATIONS)} schema migrations")
@@ -0,0 +1,225 @@
+import os
+import re
+import gzip
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.s3 import upload_from_path
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "renderlogs"
+LEGACY_TABLE = "renderlogs_legacy"
+MONTHLY_PARTITION = re.compile(r'^renderlogs_y(\d{4})m(\d{2})$')
+UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+# Arbitrary constant identifying the maintenance advisory lock, so only
+# one replica converts, creates or drops partitions at a time.
+MAINTENANCE_LOCK_ID = 72_615_001
+
+
+def month_start(value: datetime, offset: int = 0) -> datetime:
+    month_index = value.year * 12 + value.month - 1 + offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARENT_TABLE}_y{start.year}m{start.month:02d}"
+
+
+def _relkind(conn, table: str) -> str | None:
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": table}
+    ).scalar()
+
+
+def list_partitions(conn) -> list[tuple[str, datetime | None]]:
+    """
+    (name, exclusive upper bound) of every partition of renderlogs.
+    """
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        f"WHERE i.inhparent = '{PARENT_TABLE}'::regclass"
+    )).fetchall()
+    
+    partitions = []
+    for name, bound in rows:
+        match = UPPER_BOUND.search(bound or "")
+        upper = datetime.fromisoformat(match.group(1)).astimezone(timezone.utc) if match else None
+        partitions.append((name, upper))
+    return partitions
+
+
+def convert_legacy_table(conn) -> bool:
+    """
+    Turn a plain renderlogs table from an older version into the first
+    partition of a new partitioned renderlogs table, covering everything
+    up to the start of next month. Returns False if nothing to convert.
+    """
+    from app.models.renderlog import RenderLog
+    
+    if _relkind(conn, PARENT_TABLE) != "r":
+        return False
+    
+    logger.info("Converting renderlogs to a partitioned table")
+    legacy_indexes = conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :name"),
+        {"name": PARENT_TABLE}
+    ).scalars().all()
+    
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+    for index_name in legacy_indexes:
+        conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:54]}_legacy"'))
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+    conn.execute(text(f"UPDATE {LEGACY_TABLE} SET created_at = now() WHERE created_at IS NULL"))
+    conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    
+    # A partition's primary key must include the partition column; the old
+    # key on id alone would clash with the parent's (id, created_at).
+    legacy_pkey = conn.execute(
+        text("SELECT conname FROM pg_constraint WHERE conrelid = CAST(:name AS regclass) AND contype = 'p'"),
+        {"name": LEGACY_TABLE}
+    ).scalar()
+    if legacy_pkey:
+        conn.execute(text(f'ALTER TABLE {LEGACY_TABLE} DROP CONSTRAINT "{legacy_pkey}"'))
+    conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} ADD CONSTRAINT {LEGACY_TABLE}_pkey PRIMARY KEY (id, created_at)"))
+    
+    RenderLog.__table__.create(conn)
+    conn.execute(text(
+        f"SELECT setval('{PARENT_TABLE}_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM {LEGACY_TABLE}), false)"
+    ))
+    
+    upper = month_start(datetime.now(timezone.utc), 1)
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {LEGACY_TABLE} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{upper.isoformat()}')"
+    ))
+    return True
+
+
+def ensure_partitions(conn, months_ahead: int | None = None) -> list[str]:
+    """
+    Create the monthly partitions for the current month and the next
+    months_ahead months, skipping ranges an existing partition covers.
+    """
+    months_ahead = settings.RENDERLOG_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    existing = list_partitions(conn)
+    names = {name for name, _ in existing}
+    covered_until = max(
+        (upper for name, upper in existing if upper is not None and not MONTHLY_PARTITION.match(name)),
+        default=None
+    )
+    
+    created = []
+    now = datetime.now(timezone.utc)
+    for offset in range(0, months_ahead + 1):
+        start = month_start(now, offset)
+        end = month_start(now, offset + 1)
+        name = partition_name(start)
+        if name in names or (covered_until is not None and end <= covered_until):
+            continue
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        created.append(name)
+    return created
+
+
+def _export_partition(conn, name: str) -> bool:
+    """
+    Stream a partition as gzipped CSV into storage under archives/renderlogs/.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".csv.gz")
+    os.close(fd)
+    try:
+        cursor = conn.connection.driver_connection.cursor()
+        with gzip.open(tmp_path, "wb") as archive:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER true)", archive)
+        cursor.close()
+        return upload_from_path(settings.S3_BUCKET, f"archives/{PARENT_TABLE}/{name}.csv.gz", tmp_path)
+    finally:
+        os.remove(tmp_path)
+
+
+def drop_expired_partitions(conn, retention_months: int | None = None) -> list[str]:
+    """
+    Archive (if RENDERLOG_ARCHIVE) and drop whole partitions whose range
+    ended more than retention_months ago. Rollups are kept, so analytics
+    still cover the dropped period.
+    
+    Commits on conn as it goes: every export finishes before the first
+    DETACH, and each DETACH/DROP is its own short transaction, so the
+    exclusive lock on renderlogs is never held across a slow upload.
+    """
+    retention_months = settings.RENDERLOG_RETENTION_MONTHS if retention_months is None else retention_months
+    if retention_months <= 0:
+        return []
+    
+    cutoff = month_start(datetime.now(timezone.utc), -retention_months)
+    expired = [name for name, upper in list_partitions(conn) if upper is not None and upper <= cutoff]
+    conn.commit()
+    
+    if settings.RENDERLOG_ARCHIVE:
+        archived = []
+        for name in expired:
+            exported = _export_partition(conn, name)
+            conn.commit()
+            if exported:
+                archived.append(name)
+            else:
+                logger.error(f"Archiving partition {name} failed, keeping it")
+        expired = archived
+    
+    dropped = []
+    for name in expired:
+        conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        conn.commit()
+        dropped.append(name)
+    return dropped
+
+
+def prepare_renderlogs(conn) -> None:
+    convert_legacy_table(conn)
+    created = ensure_partitions(conn)
+    if created:
+        logger.info(f"Created render log partitions: {', '.join(created)}")
+
+
+def run_partition_maintenance(engine) -> dict:
+    """
+    Create upcoming partitions and retire expired ones. Safe to run from
+    every replica: only the holder of the advisory lock does the work.
+    """
+    with engine.connect() as conn:
+        # Session-level lock: it has to outlive the commits below.
+        locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": MAINTENANCE_LOCK_ID}).scalar()
+        conn.commit()
+        if not locked:
+            return {"created": [], "dropped": []}
+        try:
+            created = ensure_partitions(conn)
+            conn.commit()
+            dropped = drop_expired_partitions(conn)
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+            conn.commit()
+    if created or dropped:
+        logger.info(f"Render log partitions created: {created}, dropped: {dropped}")
+    return {"created": created, "dropped": dropped}
+
+
+async def run_partition_maintenance_loop(engine) -> None:
+    while True:
+        try:
+            await asyncio.to_thread(run_partition_maintenance, engine)
+        except Exception as e:
+            logger.error(f"Render log partition maintenance failed: {str(e)}")
+        await asyncio.sleep(settings.RENDERLOG_MAINTENANCE_INTERVAL_SECONDS)
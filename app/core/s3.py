@@ -1,85 +1,280 @@
-import boto3
+import os
+import shutil
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 from app.core.config import settings
 
+LOCAL_STORAGE_PATH = "local_storage"
+
 
-def get_s3_client():
-    if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
-        return boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION
+class StorageBackend:
+    """
+    Object storage interface used by the module-level helpers below.
+    Implementations must be safe to share between threads.
+    """
+    
+    def upload(self, bucket: str, key: str, data: bytes) -> bool:
+        raise NotImplementedError
+    
+    def upload_from_path(self, bucket: str, key: str, path: str) -> bool:
+        """
+        Upload a file without reading it into memory.
+        """
+        raise NotImplementedError
+    
+    def get(self, bucket: str, key: str) -> bytes | None:
+        raise NotImplementedError
+    
+    def head(self, bucket: str, key: str) -> str | None:
+        raise NotImplementedError
+    
+    def delete(self, bucket: str, key: str) -> bool:
+        raise NotImplementedError
+    
+    def presign(self, bucket: str, key: str, expires_in: int, filename: str | None = None) -> str | None:
+        """
+        Time-limited download URL served by the backend itself, or None
+        if the backend cannot sign URLs.
+        """
+        return None
+    
+    def local_path(self, key: str) -> str | None:
+        """
+        Filesystem path of an existing object, for zero-copy responses.
+        """
+        return None
+
+
+class S3Storage(StorageBackend):
+    def __init__(self, client):
+        self.client = client
+    
+    def upload(self, bucket: str, key: str, data: bytes) -> bool:
+        try:
+            self.client.put_object(Bucket=bucket, Key=key, Body=data)
+            return True
+        except ClientError:
+            return False
+    
+    def upload_from_path(self, bucket: str, key: str, path: str) -> bool:
+        from boto3.exceptions import S3UploadFailedError
+        try:
+            # Managed transfer: streams the file, multipart when large.
+            self.client.upload_file(path, bucket, key)
+            return True
+        except (ClientError, S3UploadFailedError):
+            return False
+    
+    def get(self, bucket: str, key: str) -> bytes | None:
+        try:
+            response = self.client.get_object(Bucket=bucket, Key=key)
+            return response['Body'].read()
+        except ClientError:
+            return None
+    
+    def head(self, bucket: str, key: str) -> str | None:
+        try:
+            response = self.client.head_object(Bucket=bucket, Key=key)
+            return response['ETag'].strip('"')
+        except ClientError:
+            return None
+    
+    def delete(self, bucket: str, key: str) -> bool:
+        try:
+            self.client.delete_object(Bucket=bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+    
+    def presign(self, bucket: str, key: str, expires_in: int, filename: str | None = None) -> str | None:
+        params = {"Bucket": bucket, "Key": key}
+        if filename:
+            params["ResponseContentDisposition"] = f"attachment; filename={filename}"
+        try:
+            return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+        except ClientError:
+            return None
+
+
+class LocalStorage(StorageBackend):
+    """
+    Filesystem fallback used when no S3 credentials are configured.
+    The bucket is ignored; keys map to paths under root.
+    """
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def upload(self, bucket: str, key: str, data: bytes) -> bool:
+        try:
+            full_path = os.path.join(self.root, key)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as f:
+                f.write(data)
+            return True
+        except Exception:
+            return False
+    
+    def upload_from_path(self, bucket: str, key: str, path: str) -> bool:
+        try:
+            full_path = os.path.join(self.root, key)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            shutil.copyfile(path, full_path)
+            return True
+        except Exception:
+            return False
+    
+    def get(self, bucket: str, key: str) -> bytes | None:
+        try:
+            full_path = os.path.join(self.root, key)
+            with open(full_path, 'rb') as f:
+                return f.read()
+        except Exception:
+            return None
+    
+    def head(self, bucket: str, key: str) -> str | None:
+        try:
+            stat = os.stat(os.path.join(self.root, key))
+            return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        except OSError:
+            return None
+    
+    def delete(self, bucket: str, key: str) -> bool:
+        try:
+            full_path = os.path.join(self.root, key)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+            return True
+        except Exception:
+            return False
+    
+    def local_path(self, key: str) -> str | None:
+        full_path = os.path.join(self.root, key)
+        return full_path if os.path.isfile(full_path) else None
+
+
+_storage: StorageBackend | None = None
+_storage_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _create_s3_client():
+    import boto3
+    from botocore.config import Config
+    
+    return boto3.session.Session().client(
+        's3',
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+        endpoint_url=settings.S3_ENDPOINT_URL or None,
+        config=Config(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "adaptive"},
+            connect_timeout=settings.S3_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=settings.S3_READ_TIMEOUT_SECONDS,
+            tcp_keepalive=True
         )
-    return None
+    )
 
 
-def upload_file(bucket: str, key: str, data: bytes) -> bool:
-    client = get_s3_client()
-    if client is None:
-        return _local_upload(key, data)
+def get_storage() -> StorageBackend:
+    """
+    Process-wide storage backend. The S3 client (and its connection pool)
+    is built once, so credentials, endpoints and TLS sessions are reused.
+    """
+    global _storage
     
-    try:
-        client.put_object(Bucket=bucket, Key=key, Body=data)
-        return True
-    except ClientError:
-        return False
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
+                    _storage = S3Storage(_create_s3_client())
+                else:
+                    _storage = LocalStorage(LOCAL_STORAGE_PATH)
+    return _storage
+
+
+def get_s3_client():
+    storage = get_storage()
+    return storage.client if isinstance(storage, S3Storage) else None
+
+
+def _reset_after_fork() -> None:
+    # Pooled sockets must not be shared with a forked child.
+    global _storage, _storage_lock, _executor
+    _storage = None
+    _storage_lock = threading.Lock()
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def upload_file(bucket: str, key: str, data: bytes) -> bool:
+    return get_storage().upload(bucket, key, data)
+
+
+def upload_from_path(bucket: str, key: str, path: str) -> bool:
+    return get_storage().upload_from_path(bucket, key, path)
 
 
 def get_file(bucket: str, key: str) -> bytes | None:
-    client = get_s3_client()
-    if client is None:
-        return _local_get(key)
-    
-    try:
-        response = client.get_object(Bucket=bucket, Key=key)
-        return response['Body'].read()
-    except ClientError:
-        return None
+    return get_storage().get(bucket, key)
+
+
+def head_file(bucket: str, key: str) -> str | None:
+    """
+    Return a version tag (ETag) for the object without downloading it,
+    or None if it does not exist.
+    """
+    return get_storage().head(bucket, key)
 
 
 def delete_file(bucket: str, key: str) -> bool:
-    client = get_s3_client()
-    if client is None:
-        return _local_delete(key)
+    return get_storage().delete(bucket, key)
+
+
+def presign_url(bucket: str, key: str, expires_in: int, filename: str | None = None) -> str | None:
+    return get_storage().presign(bucket, key, expires_in, filename)
+
+
+def local_path(key: str) -> str | None:
+    return get_storage().local_path(key)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
     
-    try:
-        client.delete_object(Bucket=bucket, Key=key)
-        return True
-    except ClientError:
-        return False
+    if _executor is None:
+        with _storage_lock:
+            if _executor is None:
+                # One thread per pooled connection, separate from the default
+                # threadpool that serves sync routes.
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.S3_MAX_POOL_CONNECTIONS,
+                    thread_name_prefix="storage"
+                )
+    return _executor
 
 
-import os
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
 
-LOCAL_STORAGE_PATH = "local_storage"
 
+async def upload_file_async(bucket: str, key: str, data: bytes) -> bool:
+    return await _run(upload_file, bucket, key, data)
 
-def _local_upload(key: str, data: bytes) -> bool:
-    try:
-        full_path = os.path.join(LOCAL_STORAGE_PATH, key)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, 'wb') as f:
-            f.write(data)
-        return True
-    except Exception:
-        return False
 
+async def get_file_async(bucket: str, key: str) -> bytes | None:
+    return await _run(get_file, bucket, key)
 
-def _local_get(key: str) -> bytes | None:
-    try:
-        full_path = os.path.join(LOCAL_STORAGE_PATH, key)
-        with open(full_path, 'rb') as f:
-            return f.read()
-    except Exception:
-        return None
+
+async def head_file_async(bucket: str, key: str) -> str | None:
+    return await _run(head_file, bucket, key)
 
 
-def _local_delete(key: str) -> bool:
-    try:
-        full_path = os.path.join(LOCAL_STORAGE_PATH, key)
-        if os.path.exists(full_path):
-            os.remove(full_path)
-        return True
-    except Exception:
-        return False
+async def delete_file_async(bucket: str, key: str) -> bool:
+    return await _run(delete_file, bucket, key)
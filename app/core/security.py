@@ -1,12 +1,17 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core import auth_cache, invalidation
 
 security = HTTPBearer()
 
@@ -16,7 +21,64 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """
+    True if the hash was made with a different work factor than
+    BCRYPT_ROUNDS (bcrypt hashes look like $2b$<rounds>$...).
+    """
+    try:
+        return int(hashed_password.split('$')[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+# bcrypt releases the GIL, so a small dedicated pool hashes in parallel
+# without competing with the threadpool that serves sync routes.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+_hash_stats = {"count": 0, "rejected": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+
+async def _run_password_job(fn, *args):
+    global _hash_pending
+    
+    if _hash_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+        _hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, try again later",
+            headers={"Retry-After": "2"}
+        )
+    
+    _hash_pending += 1
+    start_time = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_pending -= 1
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        _hash_stats["count"] += 1
+        _hash_stats["total_ms"] += elapsed_ms
+        _hash_stats["max_ms"] = max(_hash_stats["max_ms"], elapsed_ms)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+
+def get_hash_stats() -> dict:
+    return {**_hash_stats, "pending": _hash_pending, "workers": settings.PASSWORD_HASH_WORKERS}
+
+
+def hash_api_key(key: str) -> str:
+    return auth_cache.token_digest(key)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -52,7 +114,7 @@ def decode_token(token: str) -> dict:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     from app.models.user import User
     
@@ -72,28 +134,43 @@ async def get_current_user(
             detail="Could not validate credentials"
         )
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    cached = auth_cache.get_user(int(user_id))
+    if not auth_cache.is_missing(cached):
+        return cached
+    
+    result = await db.execute(select(User).filter(User.id == int(user_id)))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
+    auth_cache.set_user(user)
     return user
 
 
 async def get_current_user_or_api_key(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     from app.models.user import User
     from app.models.apikey import APIKey
     
     token = credentials.credentials
+    digest = hash_api_key(token)
+    
+    await invalidation.poll_async(db)
+    cached = auth_cache.get_api_key_user(digest)
+    if cached is not None and not auth_cache.is_missing(cached):
+        return cached
     
-    api_key = db.query(APIKey).filter(APIKey.key == token).first()
-    if api_key:
-        user = db.query(User).filter(User.id == api_key.owner_id).first()
+    if auth_cache.is_missing(cached):
+        result = await db.execute(select(User).join(APIKey, APIKey.owner_id == User.id).filter(
+            APIKey.key_hash == digest
+        ))
+        user = result.scalars().first()
+        auth_cache.set_api_key_user(digest, user)
         if user:
             return user
     
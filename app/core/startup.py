@@ -0,0 +1,119 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.core.metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = Gauge(
+    "pdfapi_startup_seconds",
+    "Seconds spent in each startup phase of this worker process; phase=total is time until ready",
+    ("phase",)
+)
+
+# app/main.py imports this module first, so import time counts toward
+# the import and total phases.
+_started_at = time.perf_counter()
+_state = {"ready": False, "phase": "starting"}
+
+
+@contextmanager
+def startup_phase(name: str):
+    _state["phase"] = name
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        STARTUP_SECONDS.set(elapsed, phase=name)
+        logger.info(f"Startup phase {name} took {elapsed:.3f}s")
+
+
+def mark_ready() -> None:
+    total = time.perf_counter() - _started_at
+    STARTUP_SECONDS.set(total, phase="total")
+    _state.update(ready=True, phase="ready")
+    logger.info(f"Ready after {total:.3f}s")
+
+
+def mark_imported() -> None:
+    STARTUP_SECONDS.set(time.perf_counter() - _started_at, phase="import")
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def get_phase() -> str:
+    return _state["phase"]
+
+
+def _most_used_templates(limit: int) -> list[tuple]:
+    from sqlalchemy import func
+    from app.core.database import SessionLocal
+    from app.models.renderlog_rollup import RenderLogRollup
+    from app.models.template import Template
+    
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    db = SessionLocal()
+    try:
+        return db.query(Template.id, Template.owner_id, Template.s3_path).join(
+            RenderLogRollup, RenderLogRollup.template_id == Template.id
+        ).filter(
+            RenderLogRollup.bucket_start >= since
+        ).group_by(
+            Template.id, Template.owner_id, Template.s3_path
+        ).order_by(func.sum(RenderLogRollup.total).desc()).limit(limit).all()
+    finally:
+        db.close()
+
+
+def preload_templates(limit: int) -> int:
+    """
+    Load the most rendered templates of the last week into the template
+    source cache and compile them, so their first render is warm.
+    """
+    from app.services.template_cache import load_and_cache
+    from app.utils.jinja_engine import get_compiled_template
+    
+    loaded = 0
+    for template_id, owner_id, s3_path in _most_used_templates(limit):
+        cached = load_and_cache(template_id, owner_id, s3_path)
+        if cached is None:
+            continue
+        try:
+            get_compiled_template(cached.html, template_id)
+        except Exception as e:
+            logger.warning(f"Could not compile template {template_id} during warm-up: {str(e)}")
+            continue
+        loaded += 1
+    return loaded
+
+
+async def warm_up() -> None:
+    """
+    Pre-render a small document on every render worker and preload the
+    most used templates, then report ready. Failures are logged and never
+    keep the process from becoming ready.
+    """
+    from app.utils.pdf_engine import render_pool
+    
+    if settings.WARMUP_RENDER:
+        with startup_phase("warmup_render"):
+            try:
+                await render_pool.warm_up()
+            except Exception as e:
+                logger.error(f"Warm-up render failed: {str(e)}")
+    
+    if settings.WARMUP_TEMPLATES > 0:
+        with startup_phase("warmup_templates"):
+            try:
+                loaded = await asyncio.to_thread(preload_templates, settings.WARMUP_TEMPLATES)
+                logger.info(f"Preloaded {loaded} templates")
+            except Exception as e:
+                logger.error(f"Preloading templates failed: {str(e)}")
+    
+    mark_ready()
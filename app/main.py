@@ -1,16 +1,45 @@
+import asyncio
+from app.core import startup
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
-from app.routes import auth, templates, render, apikeys, me, web, images, pdf_convert
-from app.core.database import engine, Base
-from app.models import user, template, apikey, renderlog
+from contextlib import asynccontextmanager, suppress
+from app.routes import auth, templates, render, apikeys, me, web, images, pdf_convert, analytics, metrics, outputs
+from app.core.config import settings
+from app.core.database import engine, async_engine, Base
+from app.core.migrations import run_migrations
+from app.core.partitions import run_partition_maintenance_loop
+from app.models import user, template, apikey, renderlog, renderlog_rollup, renderjob, cache_invalidation
+from app.services.log_service import render_log_buffer
+from app.services.output_service import run_output_retention
+from app.utils.pdf_engine import render_pool
+from app.utils.pdf_to_images import run_image_retention
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    if settings.DB_CREATE_ON_STARTUP:
+        with startup.startup_phase("database"):
+            Base.metadata.create_all(bind=engine)
+            run_migrations(engine)
+    with startup.startup_phase("services"):
+        render_pool.start()
+        render_log_buffer.start()
+    background_tasks = [
+        asyncio.create_task(startup.warm_up()),
+        asyncio.create_task(run_image_retention()),
+        asyncio.create_task(run_output_retention()),
+        asyncio.create_task(run_partition_maintenance_loop(engine)),
+    ]
     yield
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await render_log_buffer.stop()
+    render_pool.shutdown()
+    await async_engine.dispose()
 
 
 app = FastAPI(
@@ -37,9 +66,26 @@ app.include_router(templates.router, prefix="/api")
 app.include_router(render.router, prefix="/api")
 app.include_router(images.router, prefix="/api")
 app.include_router(pdf_convert.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
+app.include_router(outputs.router, prefix="/api")
 app.include_router(web.router)
+app.include_router(metrics.router)
 
 
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    503 until the warm-up stage has finished, for load balancer and
+    orchestrator readiness checks.
+    """
+    if not startup.is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming_up", "phase": startup.get_phase()})
+    return {"status": "ready"}
+
+
+startup.mark_imported()
@@ -7,6 +7,7 @@ class APIKey(Base):
     __tablename__ = "apikeys"
     
     id = Column(Integer, primary_key=True, index=True)
-    key = Column(String(64), unique=True, index=True, nullable=False)
+    key_hash = Column(String(64), unique=True, index=True, nullable=False)
+    key_prefix = Column(String(8), nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
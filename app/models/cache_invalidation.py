@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class CacheInvalidation(Base):
+    __tablename__ = "cache_invalidations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(50), nullable=False)
+    key = Column(String(255), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func, text
+import uuid
+from app.core.database import Base
+
+
+class RenderJob(Base):
+    __tablename__ = "renderjobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    template_id = Column(UUID(as_uuid=True), ForeignKey("templates.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    data = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, default="queued")
+    callback_url = Column(String(2048), nullable=True)
+    base_url = Column(String(500), nullable=True)
+    result_path = Column(String(500), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    __table_args__ = (
+        # Only queued and running jobs are ever scanned by status.
+        Index(
+            "ix_renderjobs_active_status_created_at", "status", "created_at",
+            postgresql_where=text("status IN ('queued', 'running')")
+        ),
+    )
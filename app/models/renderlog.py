@@ -1,15 +1,25 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 
 class RenderLog(Base):
+    """
+    Range-partitioned by month on created_at (see app/core/partitions.py),
+    which is why created_at is part of the primary key.
+    """
     __tablename__ = "renderlogs"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     template_id = Column(UUID(as_uuid=True), ForeignKey("templates.id"), nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     duration_ms = Column(Integer, nullable=False)
     status = Column(String(50), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_renderlogs_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_renderlogs_template_id_created_at", "template_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, JSON, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from app.core.database import Base
+
+
+class RenderLogRollup(Base):
+    __tablename__ = "renderlog_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    template_id = Column(UUID(as_uuid=True), ForeignKey("templates.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    duration_sum_ms = Column(BigInteger, nullable=False, default=0)
+    duration_max_ms = Column(Integer, nullable=False, default=0)
+    duration_histogram = Column(JSON, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("template_id", "bucket_start", name="uq_renderlog_rollups_template_bucket"),
+        Index("ix_renderlog_rollups_owner_id_bucket_start", "owner_id", "bucket_start"),
+    )
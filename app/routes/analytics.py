@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.core.security import get_current_user_or_api_key
+from app.schemas.analytics import TemplateAnalyticsResponse
+from app.services.analytics_service import get_template_analytics
+from app.models.user import User
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@router.get("/templates", response_model=TemplateAnalyticsResponse)
+def template_analytics(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    bucket: Literal["hour", "day"] = "hour",
+    template_id: Optional[UUID] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_or_api_key)
+):
+    """
+    Render counts, error rates and p50/p95/p99 durations per template and
+    time bucket. Defaults to the last 24 hours.
+    """
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(days=1)
+    
+    buckets = get_template_analytics(db, current_user, since, until, bucket, template_id)
+    return TemplateAnalyticsResponse(since=since, until=until, bucket=bucket, buckets=buckets)
@@ -1,36 +1,43 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.core.security import get_current_user
-from app.schemas.apikey import APIKeyResponse, APIKeyListResponse
+from app.schemas.apikey import APIKeyCreatedResponse, APIKeyListResponse
 from app.services.apikey_service import create_api_key, get_api_keys, delete_api_key
 from app.models.user import User
 
 router = APIRouter(prefix="/apikeys", tags=["apikeys"])
 
 
-@router.post("/create", response_model=APIKeyResponse)
+@router.post("/create", response_model=APIKeyCreatedResponse)
 async def create_key(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    return create_api_key(db, current_user)
+    api_key, key = await create_api_key(db, current_user)
+    return APIKeyCreatedResponse(
+        id=api_key.id,
+        key=key,
+        key_prefix=api_key.key_prefix,
+        owner_id=api_key.owner_id,
+        created_at=api_key.created_at
+    )
 
 
 @router.get("", response_model=APIKeyListResponse)
 async def list_keys(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    keys = get_api_keys(db, current_user)
+    keys = await get_api_keys(db, current_user)
     return APIKeyListResponse(api_keys=keys, total=len(keys))
 
 
 @router.delete("/{api_key_id}")
 async def delete_key(
     api_key_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    delete_api_key(db, api_key_id, current_user)
+    await delete_api_key(db, api_key_id, current_user)
     return {"message": "API key deleted successfully"}
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db
 from app.core.security import decode_token
 from app.schemas.user import UserCreate, UserLogin, TokenResponse, TokenRefresh
 from app.services.auth_service import register_user, authenticate, create_tokens
@@ -10,14 +11,14 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=TokenResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    user = register_user(db, user_data.email, user_data.password)
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await register_user(db, user_data.email, user_data.password)
     return create_tokens(user)
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate(db, user_data.email, user_data.password)
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate(db, user_data.email, user_data.password)
     return create_tokens(user)
 
 
@@ -1,23 +1,38 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 from app.utils.pdf_to_images import get_image_path
+from app.utils.http_cache import etag_matches
 
 router = APIRouter(prefix="/images", tags=["images"])
 
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_TYPES = {".png": "image/png", ".jpg": "image/jpeg"}
+
 
 @router.get("/{filename}")
-async def get_image(filename: str):
+async def get_image(filename: str, request: Request):
     """
     Download a generated image by filename.
     Only allows downloading images with valid naming pattern.
+    
+    Image files are never rewritten under the same name, so responses carry
+    a strong ETag and immutable caching, answer If-None-Match with 304 and
+    support Range requests.
     """
     filepath = get_image_path(filename)
     
     if not filepath:
         raise HTTPException(status_code=404, detail="Image not found")
     
+    etag = f'"{filepath.stem}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
     return FileResponse(
         path=str(filepath),
-        media_type="image/png",
-        filename=filename
+        media_type=MEDIA_TYPES.get(filepath.suffix, "application/octet-stream"),
+        filename=filename,
+        headers=headers
     )
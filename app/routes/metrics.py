@@ -0,0 +1,74 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core import metrics
+from app.core.auth_cache import api_key_cache, user_cache
+from app.core.database import get_pool_stats
+from app.core.security import get_hash_stats
+from app.services.log_service import render_log_buffer
+from app.services.template_cache import template_cache
+from app.utils import jinja_engine, pdf_cache, pdf_to_images
+from app.utils.pdf_engine import render_pool
+
+router = APIRouter(tags=["metrics"])
+
+
+def _cache_samples(cache_name: str, stats: dict) -> list[tuple]:
+    samples = []
+    for event, value in stats.items():
+        if isinstance(value, (int, float)) and event not in ("size", "bytes", "max_size", "max_bytes"):
+            samples.append((
+                "pdfapi_cache_events_total", "counter", "Cache lookups and evictions by cache and outcome",
+                {"cache": cache_name, "event": event}, value
+            ))
+    if "size" in stats:
+        samples.append(("pdfapi_cache_entries", "gauge", "Entries currently held by each cache", {"cache": cache_name}, stats["size"]))
+    return samples
+
+
+def collect_runtime_metrics() -> list[tuple]:
+    queue_doc = "Items waiting or running in each in-process queue"
+    samples = [
+        ("pdfapi_queue_depth", "gauge", queue_doc, {"queue": "render_pool"}, render_pool.pending),
+        ("pdfapi_queue_depth", "gauge", queue_doc, {"queue": "render_log_buffer"}, render_log_buffer.depth),
+        ("pdfapi_queue_depth", "gauge", queue_doc, {"queue": "password_hash"}, get_hash_stats()["pending"]),
+        ("pdfapi_render_workers", "gauge", "Configured render worker processes", {}, render_pool.workers),
+    ]
+    
+    limiter = pdf_to_images._raster_limiter
+    if limiter is not None:
+        samples.append(("pdfapi_queue_depth", "gauge", queue_doc, {"queue": "rasterize"}, limiter.borrowed_tokens))
+    
+    pool_doc = "Database pool connections by engine and state"
+    for engine_name, pool in get_pool_stats().items():
+        for state in ("checked_in", "checked_out", "overflow"):
+            samples.append(("pdfapi_db_pool_connections", "gauge", pool_doc, {"engine": engine_name, "state": state}, pool[state]))
+        samples.append(("pdfapi_db_pool_size", "gauge", "Configured database pool size", {"engine": engine_name}, pool["size"]))
+    
+    for event, value in render_log_buffer.stats.items():
+        samples.append((
+            "pdfapi_render_log_rows_total", "counter", "Render log rows by outcome",
+            {"outcome": event}, value
+        ))
+    
+    hash_stats = get_hash_stats()
+    samples.append(("pdfapi_password_hash_total", "counter", "Password hash and verify jobs", {}, hash_stats["count"]))
+    samples.append(("pdfapi_password_hash_rejected_total", "counter", "Password jobs rejected with 503", {}, hash_stats["rejected"]))
+    samples.append(("pdfapi_password_hash_seconds_sum", "counter", "Total time spent hashing passwords", {}, hash_stats["total_ms"] / 1000))
+    
+    samples.extend(_cache_samples("jinja", jinja_engine.get_cache_stats()))
+    samples.extend(_cache_samples("template_source", template_cache.get_stats()))
+    samples.extend(_cache_samples("pdf", pdf_cache.get_cache_stats()))
+    samples.extend(_cache_samples("api_key", api_key_cache.get_stats()))
+    samples.extend(_cache_samples("user", user_cache.get_stats()))
+    return samples
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus text exposition of this worker process's metrics.
+    """
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
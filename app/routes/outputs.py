@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from fastapi.responses import FileResponse
+from app.services.output_service import get_output_path
+
+router = APIRouter(prefix="/outputs", tags=["outputs"])
+
+
+@router.get("/{owner_id}/{name}")
+async def download_output(owner_id: int, name: str, expires: int, signature: str):
+    """
+    Download a stored render through a signed link from output=link.
+    The file is streamed from disk (sendfile where the server supports it)
+    without loading it into the worker.
+    """
+    path = get_output_path(owner_id, name, expires, signature)
+    
+    return FileResponse(
+        path=path,
+        media_type="application/pdf",
+        filename=name,
+        headers={"Cache-Control": "private, max-age=3600"}
+    )
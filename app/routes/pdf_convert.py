@@ -1,7 +1,8 @@
 import httpx
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
-from app.utils.pdf_to_images import pdf_to_images, PDFConversionError
+from app.utils.pdf_to_images import pdf_to_images_async, aiter_ndjson_pages, PDFConversionError
 
 router = APIRouter(prefix="/pdf-to-images", tags=["pdf-convert"])
 
@@ -9,6 +10,7 @@ router = APIRouter(prefix="/pdf-to-images", tags=["pdf-convert"])
 class PDFConvertRequest(BaseModel):
     url: HttpUrl
     dpi: int = 150
+    stream: bool = False
 
 
 @router.post("")
@@ -23,6 +25,7 @@ async def convert_pdf_to_images(
     Request body:
     - url: URL of the PDF to convert
     - dpi: Resolution for images (default: 150)
+    - stream: Report pages as NDJSON lines while they are converted
     """
     try:
         async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
@@ -42,13 +45,19 @@ async def convert_pdf_to_images(
             raise HTTPException(status_code=400, detail="URL does not point to a valid PDF file")
     
     pdf_bytes = response.content
+    base_url = str(request.base_url).rstrip("/")
+    
+    if pdf_request.stream:
+        return StreamingResponse(
+            aiter_ndjson_pages(pdf_bytes, base_url, dpi=pdf_request.dpi, source_url=str(pdf_request.url)),
+            media_type="application/x-ndjson"
+        )
     
     try:
-        filenames = pdf_to_images(pdf_bytes, dpi=pdf_request.dpi)
+        filenames = await pdf_to_images_async(pdf_bytes, dpi=pdf_request.dpi)
     except PDFConversionError as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-    base_url = str(request.base_url).rstrip("/")
     image_urls = [f"{base_url}/api/images/{filename}" for filename in filenames]
     
     return {
@@ -1,14 +1,23 @@
+import re
+import asyncio
+from contextlib import aclosing
 from uuid import UUID
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Request, HTTPException, status
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from io import BytesIO
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db
 from app.core.security import get_current_user_or_api_key
-from app.schemas.render import RenderRequest
-from app.services.render_service import render_template
+from app.schemas.render import RenderRequest, BatchRenderRequest, RenderJobRequest, RenderJobResponse, RenderOutputResponse
+from app.services.render_service import render_template, render_batch, get_render_etag
+from app.services.job_service import create_job, get_job, get_job_result
+from app.services.output_service import store_output
 from app.models.user import User
-from app.utils.pdf_to_images import pdf_to_images
+from app.utils.pdf_to_images import pdf_to_images_async, aiter_ndjson_pages
+from app.utils.pdf_engine import merge_pdfs, RenderQueueFullError
+from app.utils.zip_stream import aiter_zip
+from app.utils.http_cache import etag_matches
 
 router = APIRouter(prefix="/render", tags=["render"])
 
@@ -17,16 +26,160 @@ router = APIRouter(prefix="/render", tags=["render"])
 async def render_pdf(
     template_id: UUID,
     render_request: RenderRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_or_api_key)
+):
+    """
+    Render the template with data. Returns the PDF, or with output=link
+    stores it and returns a signed download URL valid for
+    RENDER_OUTPUT_TTL_SECONDS.
+    """
+    render_options = render_request.options.as_dict() if render_request.options else None
+    render_key = await get_render_etag(db, template_id, render_request.data, current_user, render_options)
+    etag = f'"{render_key}"'
+    if render_request.output == "pdf" and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    pdf_bytes = await render_template(db, template_id, render_request.data, current_user, render_options)
+    
+    if render_request.output == "link":
+        base_url = str(request.base_url).rstrip("/")
+        stored = await store_output(current_user, render_key, pdf_bytes, base_url)
+        return RenderOutputResponse(**stored)
+    
+    return StreamingResponse(
+        BytesIO(pdf_bytes),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename=rendered_{template_id}.pdf",
+            "ETag": etag
+        }
+    )
+
+
+def _document_name(data: dict, name_field: str | None, index: int) -> str:
+    value = data.get(name_field) if name_field else None
+    if value is None:
+        return f"document_{index + 1:05d}"
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('._') or f"document_{index + 1:05d}"
+
+
+@router.post("/{template_id}/batch")
+async def render_batch_pdf(
+    template_id: UUID,
+    batch_request: BatchRenderRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_or_api_key)
+):
+    """
+    Render the template once per item in a single request.
+    Returns a ZIP with one PDF per item (output=zip), streamed as items
+    finish, or a single merged PDF with one bookmark per item
+    (output=merged). In the ZIP a failed item becomes a .error.txt entry,
+    since the response has already started.
+    
+    Request body:
+    - items: list of data payloads
+    - output: "zip" (default) or "merged"
+    - name_field: optional data key used for file names and bookmarks
+    - options: optional image settings (dpi, jpeg_quality, optimize_images)
+    """
+    render_options = batch_request.options.as_dict() if batch_request.options else None
+    results = await render_batch(db, template_id, batch_request.items, current_user, render_options)
+    names = [
+        _document_name(data, batch_request.name_field, index)
+        for index, data in enumerate(batch_request.items)
+    ]
+    
+    if batch_request.output == "merged":
+        pdf_documents = []
+        async with aclosing(results):
+            async for index, result in results:
+                if isinstance(result, RenderQueueFullError):
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Render queue is full, try again later",
+                        headers={"Retry-After": "5"}
+                    )
+                if isinstance(result, Exception):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Rendering item {index} failed: {str(result)}"
+                    )
+                pdf_documents.append(result)
+        merged = await asyncio.to_thread(merge_pdfs, list(zip(names, pdf_documents)))
+        return StreamingResponse(
+            BytesIO(merged),
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f"attachment; filename=rendered_{template_id}.pdf"
+            }
+        )
+    
+    async def entries():
+        async for index, result in results:
+            if isinstance(result, Exception):
+                yield f"{index + 1:05d}_{names[index]}.error.txt", f"Rendering item {index} failed: {str(result)}".encode("utf-8")
+            else:
+                yield f"{index + 1:05d}_{names[index]}.pdf", result
+    
+    return StreamingResponse(
+        aiter_zip(entries()),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=rendered_{template_id}.zip"
+        }
+    )
+
+
+@router.post("/{template_id}/jobs", status_code=202)
+def submit_render_job(
+    template_id: UUID,
+    job_request: RenderJobRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_or_api_key)
+):
+    """
+    Queue a render to be processed by the render workers.
+    Returns the job id; poll the status URL or pass callback_url to be
+    notified when the job finishes.
+    """
+    callback_url = str(job_request.callback_url) if job_request.callback_url else None
+    base_url = str(request.base_url).rstrip("/")
+    job = create_job(db, template_id, job_request.data, current_user, callback_url, base_url)
+    
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "status_url": f"{base_url}/api/render/jobs/{job.id}",
+        "result_url": f"{base_url}/api/render/jobs/{job.id}/result"
+    }
+
+
+@router.get("/jobs/{job_id}", response_model=RenderJobResponse)
+def get_render_job(
+    job_id: UUID,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_or_api_key)
+):
+    return get_job(db, job_id, current_user)
+
+
+@router.get("/jobs/{job_id}/result")
+def get_render_job_result(
+    job_id: UUID,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_or_api_key)
 ):
-    pdf_bytes = render_template(db, template_id, render_request.data, current_user)
+    pdf_bytes = get_job_result(db, job_id, current_user)
     
     return StreamingResponse(
         BytesIO(pdf_bytes),
         media_type="application/pdf",
         headers={
-            "Content-Disposition": f"attachment; filename=rendered_{template_id}.pdf"
+            "Content-Disposition": f"attachment; filename=job_{job_id}.pdf"
         }
     )
 
@@ -36,28 +189,40 @@ async def render_to_images(
     template_id: UUID,
     render_request: RenderRequest,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user_or_api_key),
-    dpi: int = 150
+    dpi: int = 150,
+    stream: bool = False
 ):
     """
     Render template to PDF and convert to images.
     Returns URLs to download each page as PNG.
+    With stream=true, pages are reported as NDJSON lines while they are converted.
     """
     from fastapi import HTTPException
     from app.utils.pdf_to_images import PDFConversionError
     
+    render_options = render_request.options.as_dict() if render_request.options else None
     try:
-        pdf_bytes = render_template(db, template_id, render_request.data, current_user)
+        pdf_bytes = await render_template(db, template_id, render_request.data, current_user, render_options)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Template rendering failed: {str(e)}")
     
+    base_url = str(request.base_url).rstrip("/")
+    
+    if stream:
+        return StreamingResponse(
+            aiter_ndjson_pages(pdf_bytes, base_url, dpi=dpi, template=template_id),
+            media_type="application/x-ndjson"
+        )
+    
     try:
-        filenames = pdf_to_images(pdf_bytes, dpi=dpi)
+        filenames = await pdf_to_images_async(pdf_bytes, dpi=dpi, template=template_id)
     except PDFConversionError as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-    base_url = str(request.base_url).rstrip("/")
     image_urls = [f"{base_url}/api/images/{filename}" for filename in filenames]
     
     return {
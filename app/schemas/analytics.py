@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+
+class TemplateAnalyticsBucket(BaseModel):
+    template_id: UUID
+    bucket_start: datetime
+    count: int
+    errors: int
+    error_rate: float
+    avg_ms: Optional[float] = None
+    max_ms: int
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+
+
+class TemplateAnalyticsResponse(BaseModel):
+    since: datetime
+    until: datetime
+    bucket: str
+    buckets: list[TemplateAnalyticsBucket]
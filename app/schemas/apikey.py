@@ -8,7 +8,7 @@ class APIKeyCreate(BaseModel):
 
 class APIKeyResponse(BaseModel):
     id: int
-    key: str
+    key_prefix: str | None
     owner_id: int
     created_at: datetime
     
@@ -16,6 +16,10 @@ class APIKeyResponse(BaseModel):
         from_attributes = True
 
 
+class APIKeyCreatedResponse(APIKeyResponse):
+    key: str
+
+
 class APIKeyListResponse(BaseModel):
     api_keys: list[APIKeyResponse]
     total: int
@@ -1,6 +1,53 @@
-from pydantic import BaseModel
-from typing import Dict, Any
+from pydantic import BaseModel, Field, HttpUrl
+from datetime import datetime
+from uuid import UUID
+from typing import Dict, Any, List, Literal, Optional
+
+
+class RenderOptions(BaseModel):
+    dpi: Optional[int] = Field(None, ge=36, le=1200)
+    jpeg_quality: Optional[int] = Field(None, ge=1, le=95)
+    optimize_images: bool = False
+    
+    def as_dict(self) -> Optional[Dict[str, Any]]:
+        options = self.model_dump(exclude_defaults=True)
+        return options or None
 
 
 class RenderRequest(BaseModel):
     data: Dict[str, Any]
+    output: Literal["pdf", "link"] = "pdf"
+    options: Optional[RenderOptions] = None
+
+
+class RenderOutputResponse(BaseModel):
+    output_id: str
+    url: str
+    expires_at: datetime
+    size: int
+
+
+class BatchRenderRequest(BaseModel):
+    items: List[Dict[str, Any]] = Field(..., min_length=1)
+    output: Literal["zip", "merged"] = "zip"
+    name_field: Optional[str] = None
+    options: Optional[RenderOptions] = None
+
+
+class RenderJobRequest(BaseModel):
+    data: Dict[str, Any]
+    callback_url: Optional[HttpUrl] = None
+
+
+class RenderJobResponse(BaseModel):
+    id: UUID
+    template_id: UUID
+    status: str
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
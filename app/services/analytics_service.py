@@ -0,0 +1,181 @@
+import uuid
+import bisect
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models.renderlog import RenderLog
+from app.models.renderlog_rollup import RenderLogRollup
+from app.models.user import User
+
+# Upper bounds (ms) of the duration histogram kept per rollup row; the
+# last bucket is open-ended. Percentiles are interpolated within buckets.
+DURATION_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+def _hour(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _empty_histogram() -> list[int]:
+    return [0] * (len(DURATION_BUCKETS_MS) + 1)
+
+
+def apply_rollups(db: Session, rows: list[dict]) -> None:
+    """
+    Fold raw render log rows into the hourly rollups, in the caller's
+    transaction. Groups are locked in a fixed order so concurrent flushes
+    from several replicas cannot deadlock.
+    """
+    groups: dict[tuple, dict] = {}
+    for row in rows:
+        key = (str(row["template_id"]), _hour(row["created_at"]))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "owner_id": row["owner_id"],
+                "total": 0,
+                "errors": 0,
+                "duration_sum_ms": 0,
+                "duration_max_ms": 0,
+                "histogram": _empty_histogram()
+            }
+        duration = int(row["duration_ms"])
+        group["total"] += 1
+        group["errors"] += 0 if row["status"] == "success" else 1
+        group["duration_sum_ms"] += duration
+        group["duration_max_ms"] = max(group["duration_max_ms"], duration)
+        group["histogram"][bisect.bisect_left(DURATION_BUCKETS_MS, duration)] += 1
+    
+    for (template_id, bucket_start), group in sorted(groups.items()):
+        template_uuid = uuid.UUID(template_id)
+        db.execute(
+            pg_insert(RenderLogRollup).values(
+                template_id=template_uuid,
+                owner_id=group["owner_id"],
+                bucket_start=bucket_start,
+                total=0,
+                errors=0,
+                duration_sum_ms=0,
+                duration_max_ms=0,
+                duration_histogram=_empty_histogram()
+            ).on_conflict_do_nothing(constraint="uq_renderlog_rollups_template_bucket")
+        )
+        rollup = db.execute(
+            select(RenderLogRollup).where(
+                RenderLogRollup.template_id == template_uuid,
+                RenderLogRollup.bucket_start == bucket_start
+            ).with_for_update()
+        ).scalar_one()
+        
+        rollup.total += group["total"]
+        rollup.errors += group["errors"]
+        rollup.duration_sum_ms += group["duration_sum_ms"]
+        rollup.duration_max_ms = max(rollup.duration_max_ms, group["duration_max_ms"])
+        rollup.duration_histogram = [a + b for a, b in zip(rollup.duration_histogram, group["histogram"])]
+
+
+def rebuild_rollups(db: Session, since: datetime | None = None, chunk_size: int = 10000) -> int:
+    """
+    Recompute rollups from raw render logs, e.g. for data written before
+    rollups existed. Existing rollups from `since` on are replaced.
+    """
+    rollups = db.query(RenderLogRollup)
+    logs = db.query(RenderLog).order_by(RenderLog.created_at)
+    if since is not None:
+        rollups = rollups.filter(RenderLogRollup.bucket_start >= _hour(since))
+        logs = logs.filter(RenderLog.created_at >= _hour(since))
+    rollups.delete(synchronize_session=False)
+    
+    processed = 0
+    batch = []
+    for log in logs.yield_per(chunk_size):
+        batch.append({
+            "template_id": log.template_id,
+            "owner_id": log.owner_id,
+            "duration_ms": log.duration_ms,
+            "status": log.status,
+            "created_at": log.created_at
+        })
+        if len(batch) >= chunk_size:
+            apply_rollups(db, batch)
+            processed += len(batch)
+            batch = []
+    if batch:
+        apply_rollups(db, batch)
+        processed += len(batch)
+    
+    db.commit()
+    return processed
+
+
+def _percentile(histogram: list[int], total: int, fraction: float, max_ms: int) -> float | None:
+    if total == 0:
+        return None
+    rank = fraction * total
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= rank:
+            lower = DURATION_BUCKETS_MS[index - 1] if index > 0 else 0
+            upper = DURATION_BUCKETS_MS[index] if index < len(DURATION_BUCKETS_MS) else max(max_ms, lower)
+            return round(lower + (upper - lower) * (rank - cumulative) / count, 1)
+        cumulative += count
+    return float(max_ms)
+
+
+def get_template_analytics(
+    db: Session,
+    owner: User,
+    since: datetime,
+    until: datetime,
+    bucket: str = "hour",
+    template_id: uuid.UUID | None = None
+) -> list[dict]:
+    """
+    Per-template counts, error rates and p50/p95/p99 durations per time
+    bucket, read from the hourly rollups (never from raw logs).
+    """
+    query = db.query(RenderLogRollup).filter(
+        RenderLogRollup.owner_id == owner.id,
+        RenderLogRollup.bucket_start >= _hour(since),
+        RenderLogRollup.bucket_start < until
+    )
+    if template_id is not None:
+        query = query.filter(RenderLogRollup.template_id == template_id)
+    
+    merged: dict[tuple, dict] = {}
+    for rollup in query.order_by(RenderLogRollup.bucket_start):
+        bucket_start = _hour(rollup.bucket_start)
+        if bucket == "day":
+            bucket_start = bucket_start.replace(hour=0)
+        key = (rollup.template_id, bucket_start)
+        entry = merged.get(key)
+        if entry is None:
+            entry = merged[key] = {
+                "total": 0, "errors": 0, "duration_sum_ms": 0, "duration_max_ms": 0,
+                "histogram": _empty_histogram()
+            }
+        entry["total"] += rollup.total
+        entry["errors"] += rollup.errors
+        entry["duration_sum_ms"] += rollup.duration_sum_ms
+        entry["duration_max_ms"] = max(entry["duration_max_ms"], rollup.duration_max_ms)
+        entry["histogram"] = [a + b for a, b in zip(entry["histogram"], rollup.duration_histogram)]
+    
+    results = []
+    for (rollup_template_id, bucket_start), entry in merged.items():
+        total = entry["total"]
+        results.append({
+            "template_id": rollup_template_id,
+            "bucket_start": bucket_start,
+            "count": total,
+            "errors": entry["errors"],
+            "error_rate": round(entry["errors"] / total, 4) if total else 0.0,
+            "avg_ms": round(entry["duration_sum_ms"] / total, 1) if total else None,
+            "max_ms": entry["duration_max_ms"],
+            "p50_ms": _percentile(entry["histogram"], total, 0.50, entry["duration_max_ms"]),
+            "p95_ms": _percentile(entry["histogram"], total, 0.95, entry["duration_max_ms"]),
+            "p99_ms": _percentile(entry["histogram"], total, 0.99, entry["duration_max_ms"])
+        })
+    return results
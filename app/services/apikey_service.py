@@ -1,33 +1,43 @@
 import secrets
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.models.apikey import APIKey
 from app.models.user import User
+from app.core.security import hash_api_key
+from app.core.auth_cache import revoke_api_key
 
 
-def create_api_key(db: Session, owner: User) -> APIKey:
+async def create_api_key(db: AsyncSession, owner: User) -> tuple[APIKey, str]:
+    """
+    Only the key's hash and its first characters are stored; the full key
+    is returned here once and cannot be recovered later.
+    """
     key = secrets.token_hex(32)
     
-    api_key = APIKey(key=key, owner_id=owner.id)
+    api_key = APIKey(key_hash=hash_api_key(key), key_prefix=key[:8], owner_id=owner.id)
     db.add(api_key)
-    db.commit()
-    db.refresh(api_key)
-    return api_key
+    await db.commit()
+    await db.refresh(api_key)
+    return api_key, key
 
 
-def get_api_keys(db: Session, owner: User) -> list[APIKey]:
-    return db.query(APIKey).filter(APIKey.owner_id == owner.id).all()
+async def get_api_keys(db: AsyncSession, owner: User) -> list[APIKey]:
+    result = await db.execute(select(APIKey).filter(APIKey.owner_id == owner.id))
+    return list(result.scalars().all())
 
 
-def validate_api_key(db: Session, key: str) -> APIKey | None:
-    return db.query(APIKey).filter(APIKey.key == key).first()
+async def validate_api_key(db: AsyncSession, key: str) -> APIKey | None:
+    result = await db.execute(select(APIKey).filter(APIKey.key_hash == hash_api_key(key)))
+    return result.scalars().first()
 
 
-def delete_api_key(db: Session, api_key_id: int, owner: User) -> bool:
-    api_key = db.query(APIKey).filter(
+async def delete_api_key(db: AsyncSession, api_key_id: int, owner: User) -> bool:
+    result = await db.execute(select(APIKey).filter(
         APIKey.id == api_key_id,
         APIKey.owner_id == owner.id
-    ).first()
+    ))
+    api_key = result.scalars().first()
     
     if not api_key:
         raise HTTPException(
@@ -35,6 +45,7 @@ def delete_api_key(db: Session, api_key_id: int, owner: User) -> bool:
             detail="API key not found"
         )
     
-    db.delete(api_key)
-    db.commit()
+    revoke_api_key(db, api_key.key_hash)
+    await db.delete(api_key)
+    await db.commit()
     return True
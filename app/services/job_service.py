@@ -0,0 +1,365 @@
+import time
+import uuid
+import socket
+import logging
+import ipaddress
+from concurrent.futures import wait
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+import httpx
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from app.models.renderjob import RenderJob
+from app.models.renderlog import RenderLog
+from app.models.user import User
+from app.core.s3 import upload_file, get_file, delete_file
+from app.core.config import settings
+from app.services.template_service import get_template
+from app.services.render_service import load_template_html, template_hash
+from app.services.analytics_service import apply_rollups
+from app.utils.pdf_cache import make_render_key, get_cached_pdf, store_cached_pdf
+from app.utils.pdf_engine import RenderPool, render_document
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+# Each job worker renders one job at a time in a child process, which is
+# killed and replaced if the job runs past RENDER_TIMEOUT_SECONDS.
+job_render_pool = RenderPool(workers=1, queue_size=0, timeout=settings.RENDER_TIMEOUT_SECONDS)
+
+
+def create_job(
+    db: Session,
+    template_id: uuid.UUID,
+    data: dict,
+    owner: User,
+    callback_url: str | None = None,
+    base_url: str | None = None
+) -> RenderJob:
+    get_template(db, template_id, owner)
+    
+    if callback_url:
+        try:
+            check_callback_url(callback_url)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid callback_url: {str(e)}"
+            )
+    
+    job = RenderJob(
+        template_id=template_id,
+        owner_id=owner.id,
+        data=data,
+        status=JOB_QUEUED,
+        callback_url=callback_url,
+        base_url=base_url
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: uuid.UUID, owner: User) -> RenderJob:
+    job = db.query(RenderJob).filter(
+        RenderJob.id == job_id,
+        RenderJob.owner_id == owner.id
+    ).first()
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return job
+
+
+def get_job_result(db: Session, job_id: uuid.UUID, owner: User) -> bytes:
+    job = get_job(db, job_id, owner)
+    
+    if job.status != JOB_DONE:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is {job.status}"
+        )
+    
+    pdf_bytes = get_file(settings.S3_BUCKET, job.result_path)
+    if pdf_bytes is None:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Job result is no longer available"
+        )
+    
+    return pdf_bytes
+
+
+def claim_next_job(db: Session) -> RenderJob | None:
+    """
+    Atomically take the next queued job. Owners with the fewest running
+    jobs go first, oldest job first within that, so one tenant's bulk run
+    cannot starve everyone else. SKIP LOCKED lets workers claim in parallel.
+    """
+    # Running counts are aggregated once, not per queued row.
+    running_counts = (
+        select(RenderJob.owner_id, func.count().label("running"))
+        .where(RenderJob.status == JOB_RUNNING)
+        .group_by(RenderJob.owner_id)
+        .cte("running_counts")
+    )
+    
+    job = db.execute(
+        select(RenderJob)
+        .outerjoin(running_counts, running_counts.c.owner_id == RenderJob.owner_id)
+        .where(RenderJob.status == JOB_QUEUED)
+        .order_by(func.coalesce(running_counts.c.running, 0), RenderJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=RenderJob)
+    ).scalar_one_or_none()
+    
+    if job is None:
+        db.rollback()
+        return None
+    
+    job.status = JOB_RUNNING
+    job.started_at = datetime.now(timezone.utc)
+    job.heartbeat_at = job.started_at
+    job.attempts += 1
+    db.commit()
+    return job
+
+
+def _heartbeat(db: Session, job_id: uuid.UUID) -> None:
+    db.execute(
+        update(RenderJob)
+        .where(RenderJob.id == job_id, RenderJob.status == JOB_RUNNING)
+        .values(heartbeat_at=func.now())
+    )
+    db.commit()
+
+
+def _render_job_pdf(db: Session, job: RenderJob, owner: User) -> bytes:
+    """
+    Render through the PDF cache like render_service.render_template, and
+    keep the job's heartbeat fresh while the render process works on it.
+    """
+    job_id = job.id
+    html_template = load_template_html(db, job.template_id, owner)
+    render_key = make_render_key(template_hash(html_template), job.data)
+    
+    pdf_bytes = get_cached_pdf(render_key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    
+    future = job_render_pool.submit(render_document, html_template, job.data, job.template_id, bytes.fromhex(render_key[:32]))
+    while not wait([future], timeout=settings.JOB_HEARTBEAT_SECONDS).done:
+        _heartbeat(db, job_id)
+    pdf_bytes, _ = future.result()
+    
+    store_cached_pdf(render_key, pdf_bytes)
+    return pdf_bytes
+
+
+def run_job(db: Session, job: RenderJob) -> None:
+    start_time = time.time()
+    attempt = job.attempts
+    result_path = None
+    error = None
+    
+    try:
+        owner = db.query(User).filter(User.id == job.owner_id).first()
+        if owner is None:
+            raise ValueError("Job owner no longer exists")
+        
+        pdf_bytes = _render_job_pdf(db, job, owner)
+        
+        result_path = f"jobs/{job.owner_id}/{job.id}.pdf"
+        if not upload_file(settings.S3_BUCKET, result_path, pdf_bytes):
+            raise IOError("Failed to store job result")
+    except Exception as e:
+        logger.error(f"Render job {job.id} failed: {str(e)}")
+        db.rollback()
+        result_path = None
+        error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+    
+    # If this worker missed its heartbeats the job may have been requeued
+    # and claimed again; the newer attempt owns the outcome then.
+    db.refresh(job, with_for_update=True)
+    if job.status != JOB_RUNNING or job.attempts != attempt:
+        logger.warning(f"Render job {job.id} was taken over by another attempt, dropping this result")
+        db.rollback()
+        return
+    
+    job.status = JOB_DONE if error is None else JOB_ERROR
+    job.result_path = result_path
+    job.error = error
+    job.finished_at = datetime.now(timezone.utc)
+    log_row = {
+        "template_id": job.template_id,
+        "owner_id": job.owner_id,
+        "duration_ms": int((time.time() - start_time) * 1000),
+        "status": "success" if error is None else "error",
+        "created_at": job.finished_at
+    }
+    db.add(RenderLog(**log_row))
+    apply_rollups(db, [log_row])
+    db.commit()
+    
+    if job.callback_url:
+        notify_callback(job)
+
+
+def check_callback_url(url: str) -> str:
+    """
+    Raise ValueError unless url is http(s), its host matches
+    JOB_CALLBACK_ALLOWED_HOSTS ("*" allows any host, ".example.com"
+    allows subdomains) and it resolves only to public addresses, so
+    callbacks cannot reach internal services. Returns one of the
+    checked addresses.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("only http and https URLs are allowed")
+    
+    host = parts.hostname.lower()
+    if not any(
+        allowed == "*" or host == allowed or (allowed.startswith(".") and host.endswith(allowed))
+        for allowed in (entry.strip().lower() for entry in settings.JOB_CALLBACK_ALLOWED_HOSTS.split(","))
+    ):
+        raise ValueError(f"host {host} is not allowed")
+    
+    try:
+        addresses = socket.getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80), proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"host {host} does not resolve")
+    for address in addresses:
+        if not ipaddress.ip_address(address[4][0].split("%")[0]).is_global:
+            raise ValueError(f"host {host} is not a public address")
+    return addresses[0][4][0]
+
+
+class PinnedTransport(httpx.HTTPTransport):
+    """
+    Connects to an address that check_callback_url vetted instead of
+    resolving the host again, so a DNS answer that changes after the
+    check (DNS rebinding) cannot point the request elsewhere. The host
+    from the URL is still sent as the Host header and as the TLS SNI,
+    and the certificate is verified against it.
+    """
+    
+    def __init__(self, address: str, **kwargs):
+        super().__init__(**kwargs)
+        self.address = address
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        request.url = request.url.copy_with(host=self.address)
+        request.extensions = {**request.extensions, "sni_hostname": host}
+        return super().handle_request(request)
+
+
+def notify_callback(job: RenderJob) -> None:
+    """
+    Best-effort POST of the final job state to the client's callback URL.
+    The URL is checked again here, since DNS may have changed since the
+    job was queued, and the request goes to the address that was checked.
+    """
+    result_url = None
+    if job.status == JOB_DONE:
+        result_url = f"{(job.base_url or '').rstrip('/')}/api/render/jobs/{job.id}/result"
+    payload = {
+        "job_id": str(job.id),
+        "template_id": str(job.template_id),
+        "status": job.status,
+        "error": job.error,
+        "result_url": result_url
+    }
+    try:
+        address = check_callback_url(job.callback_url)
+        with httpx.Client(
+            transport=PinnedTransport(address),
+            timeout=settings.JOB_CALLBACK_TIMEOUT_SECONDS,
+            follow_redirects=False
+        ) as client:
+            client.post(job.callback_url, json=payload)
+    except Exception as e:
+        logger.warning(f"Callback for job {job.id} failed: {str(e)}")
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """
+    Put jobs whose worker died back in the queue, or fail them once they
+    have used up their attempts. A live worker refreshes heartbeat_at
+    every JOB_HEARTBEAT_SECONDS, so only jobs silent for longer than
+    JOB_STALE_SECONDS are picked up, however long the render takes.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    stale_jobs = db.query(RenderJob).filter(
+        RenderJob.status == JOB_RUNNING,
+        func.coalesce(RenderJob.heartbeat_at, RenderJob.started_at) < cutoff
+    ).with_for_update(skip_locked=True).all()
+    
+    for job in stale_jobs:
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            job.status = JOB_ERROR
+            job.error = "Job exceeded its maximum attempts"
+            job.finished_at = datetime.now(timezone.utc)
+        else:
+            job.status = JOB_QUEUED
+    db.commit()
+    return len(stale_jobs)
+
+
+def purge_finished_jobs(db: Session) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.JOB_RESULT_TTL_HOURS)
+    old_jobs = db.query(RenderJob).filter(
+        RenderJob.status.in_([JOB_DONE, JOB_ERROR]),
+        RenderJob.finished_at < cutoff
+    ).limit(500).all()
+    
+    for job in old_jobs:
+        if job.result_path:
+            delete_file(settings.S3_BUCKET, job.result_path)
+        db.delete(job)
+    db.commit()
+    return len(old_jobs)
+
+
+def run_worker(poll_interval: float | None = None) -> None:
+    """
+    Process queued jobs until interrupted. Run one worker per core,
+    e.g. several replicas of render_worker.py.
+    """
+    from app.core.database import SessionLocal
+    
+    poll_interval = poll_interval or settings.JOB_POLL_SECONDS
+    last_maintenance = 0.0
+    
+    try:
+        while True:
+            db = SessionLocal()
+            try:
+                if time.monotonic() - last_maintenance > 60:
+                    last_maintenance = time.monotonic()
+                    requeue_stale_jobs(db)
+                    purge_finished_jobs(db)
+                
+                job = claim_next_job(db)
+                if job is None:
+                    time.sleep(poll_interval)
+                    continue
+                run_job(db, job)
+            except Exception as e:
+                logger.error(f"Render worker error: {str(e)}")
+                db.rollback()
+                time.sleep(poll_interval)
+            finally:
+                db.close()
+    finally:
+        job_render_pool.shutdown()
@@ -1,6 +1,27 @@
+import os
+import glob
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timezone
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.renderlog import RenderLog
 from app.models.user import User
+from app.services.analytics_service import apply_rollups
+
+logger = logging.getLogger(__name__)
+
+# Spill files of other processes untouched for this long are assumed to
+# be orphaned (their process exited) and replayed by whoever sees them.
+SPILL_ORPHAN_SECONDS = 300
 
 
 def get_render_logs(db: Session, owner: User, limit: int = 100) -> list[RenderLog]:
@@ -14,3 +35,201 @@ def get_template_logs(db: Session, template_id, owner: User, limit: int = 100) -
         RenderLog.template_id == template_id,
         RenderLog.owner_id == owner.id
     ).order_by(RenderLog.created_at.desc()).limit(limit).all()
+
+
+class RenderLogBuffer:
+    """
+    In-process buffer of RenderLog rows written in bulk by a background
+    task, so renders never wait on a log commit. Memory is bounded by
+    max_size; past it rows are spilled to a local file (replayed once the
+    database keeps up) or dropped, depending on the overflow policy.
+    
+    Each process spills to its own file, spill_path.<host>-<pid>, since
+    replicas may share the volume.
+    """
+    
+    def __init__(self, max_size: int, flush_size: int, flush_interval: float, overflow_policy: str, spill_path: str):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self._rows = deque()
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self._loop = None
+        self._task = None
+        self.stats = {"flushed": 0, "dropped": 0, "spilled": 0, "flush_errors": 0}
+    
+    @property
+    def own_spill_path(self) -> str:
+        # Evaluated on use: the pid changes in forked workers.
+        return f"{self.spill_path}.{socket.gethostname()}-{os.getpid()}"
+    
+    @property
+    def depth(self) -> int:
+        return len(self._rows)
+    
+    def add(self, template_id, owner_id: int, duration_ms: int, status: str) -> None:
+        self.add_many([{
+            "template_id": template_id,
+            "owner_id": owner_id,
+            "duration_ms": duration_ms,
+            "status": status,
+            "created_at": datetime.now(timezone.utc)
+        }])
+    
+    def add_many(self, rows: list[dict]) -> None:
+        with self._lock:
+            room = self.max_size - len(self._rows)
+            self._rows.extend(rows[:max(room, 0)])
+            overflow = rows[max(room, 0):]
+            should_flush = len(self._rows) >= self.flush_size
+        
+        if overflow:
+            self._overflow(overflow)
+        if should_flush and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+    
+    def _overflow(self, rows: list[dict]) -> None:
+        if self.overflow_policy == "spill":
+            try:
+                os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+                with self._lock, open(self.own_spill_path, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        spilled = {
+                            **row,
+                            "template_id": str(row["template_id"]),
+                            "created_at": row["created_at"].isoformat()
+                        }
+                        f.write(json.dumps(spilled) + "\n")
+                self.stats["spilled"] += len(rows)
+                return
+            except OSError as e:
+                logger.error(f"Could not spill render logs: {str(e)}")
+        self.stats["dropped"] += len(rows)
+    
+    def _claim_spilled(self) -> str | None:
+        """
+        Move a spill file to this process's replay path and return that
+        path. Own spills are always claimed; files of other processes
+        (spills or abandoned replays) only once orphaned. os.rename is
+        atomic, so of several replicas racing for a file exactly one wins.
+        """
+        replay_path = f"{self.own_spill_path}.replay"
+        if os.path.exists(replay_path):
+            os.utime(replay_path)
+            return replay_path
+        
+        with self._lock:
+            with suppress(FileNotFoundError):
+                os.rename(self.own_spill_path, replay_path)
+                os.utime(replay_path)
+                return replay_path
+        
+        for candidate in glob.glob(f"{glob.escape(self.spill_path)}*"):
+            if candidate == self.own_spill_path:
+                continue
+            try:
+                if time.time() - os.path.getmtime(candidate) < SPILL_ORPHAN_SECONDS:
+                    continue
+                os.rename(candidate, replay_path)
+            except FileNotFoundError:
+                continue
+            # Fresh mtime marks the replay as live for other processes.
+            os.utime(replay_path)
+            return replay_path
+        return None
+    
+    def _take_spilled(self) -> tuple[str | None, list[dict]]:
+        replay_path = self._claim_spilled()
+        if replay_path is None:
+            return None, []
+        
+        rows = []
+        with open(replay_path, "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                row["template_id"] = uuid.UUID(row["template_id"])
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+                rows.append(row)
+        return replay_path, rows
+    
+    async def _write(self, rows: list[dict]) -> None:
+        from app.core.database import AsyncSessionLocal
+        
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(rows), self.flush_size):
+                await db.execute(insert(RenderLog), rows[start:start + self.flush_size])
+            await db.run_sync(apply_rollups, rows)
+            await db.commit()
+    
+    async def flush(self) -> int:
+        """
+        Write everything buffered (and any spilled rows) in bulk inserts
+        on the async engine.
+        """
+        with self._lock:
+            rows = list(self._rows)
+            self._rows.clear()
+        
+        if rows:
+            try:
+                await self._write(rows)
+            except Exception as e:
+                logger.error(f"Flushing {len(rows)} render logs failed: {str(e)}")
+                self.stats["flush_errors"] += 1
+                # Keep the rows for the next attempt, up to the buffer bound.
+                with self._lock:
+                    room = self.max_size - len(self._rows)
+                    self._rows.extendleft(reversed(rows[:max(room, 0)]))
+                    overflow = rows[max(room, 0):]
+                if overflow:
+                    self._overflow(overflow)
+                return 0
+            self.stats["flushed"] += len(rows)
+        
+        try:
+            replay_path, spilled = await asyncio.to_thread(self._take_spilled)
+            if spilled:
+                await self._write(spilled)
+                self.stats["flushed"] += len(spilled)
+            if replay_path is not None:
+                os.remove(replay_path)
+        except Exception as e:
+            logger.error(f"Replaying spilled render logs failed: {str(e)}")
+            self.stats["flush_errors"] += 1
+        
+        return len(rows)
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._wakeup = None
+        await self.flush()
+
+
+render_log_buffer = RenderLogBuffer(
+    max_size=settings.RENDER_LOG_BUFFER_SIZE,
+    flush_size=settings.RENDER_LOG_FLUSH_SIZE,
+    flush_interval=settings.RENDER_LOG_FLUSH_SECONDS,
+    overflow_policy=settings.RENDER_LOG_OVERFLOW_POLICY,
+    spill_path=settings.RENDER_LOG_SPILL_PATH
+)
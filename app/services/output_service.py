@@ -0,0 +1,107 @@
+import os
+import re
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.core.s3 import LOCAL_STORAGE_PATH, upload_file_async, presign_url, local_path, get_storage, LocalStorage
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_PREFIX = "outputs"
+OUTPUT_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.pdf$')
+
+
+def output_key(owner_id: int, name: str) -> str:
+    return f"{OUTPUT_PREFIX}/{owner_id}/{name}"
+
+
+def sign_output(owner_id: int, name: str, expires: int) -> str:
+    message = f"{owner_id}/{name}:{expires}".encode('utf-8')
+    return hmac.new(settings.SECRET_KEY.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+async def store_output(owner: User, render_key: str, pdf_bytes: bytes, base_url: str) -> dict:
+    """
+    Store a rendered PDF under outputs/ and return a signed download link
+    valid for RENDER_OUTPUT_TTL_SECONDS. Identical renders share one object.
+    """
+    name = f"{render_key}.pdf"
+    key = output_key(owner.id, name)
+    
+    if not await upload_file_async(settings.S3_BUCKET, key, pdf_bytes):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to store rendered PDF"
+        )
+    
+    ttl = settings.RENDER_OUTPUT_TTL_SECONDS
+    expires = int(time.time()) + ttl
+    url = presign_url(settings.S3_BUCKET, key, ttl, name)
+    if url is None:
+        signature = sign_output(owner.id, name, expires)
+        url = f"{base_url}/api/outputs/{owner.id}/{name}?expires={expires}&signature={signature}"
+    
+    return {
+        "output_id": f"{owner.id}/{render_key}",
+        "url": url,
+        "expires_at": datetime.fromtimestamp(expires, timezone.utc),
+        "size": len(pdf_bytes)
+    }
+
+
+def get_output_path(owner_id: int, name: str, expires: int, signature: str) -> str:
+    """
+    Check a signed download link and return the stored file's path.
+    """
+    if not OUTPUT_NAME_PATTERN.match(name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Output not found")
+    
+    if not hmac.compare_digest(sign_output(owner_id, name, expires), signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid signature")
+    
+    if expires < time.time():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Download link expired")
+    
+    path = local_path(output_key(owner_id, name))
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Output not found")
+    return path
+
+
+def cleanup_expired_outputs(max_age_seconds: int) -> int:
+    """
+    Delete local outputs older than max_age_seconds. S3 buckets should use
+    a lifecycle rule on the outputs/ prefix instead.
+    """
+    if not isinstance(get_storage(), LocalStorage):
+        return 0
+    
+    cutoff = time.time() - max_age_seconds
+    deleted = 0
+    for root, _, files in os.walk(os.path.join(LOCAL_STORAGE_PATH, OUTPUT_PREFIX)):
+        for filename in files:
+            path = os.path.join(root, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+            except OSError:
+                continue
+    return deleted
+
+
+async def run_output_retention() -> None:
+    while True:
+        try:
+            deleted = await asyncio.to_thread(cleanup_expired_outputs, settings.RENDER_OUTPUT_TTL_SECONDS)
+            if deleted:
+                logger.info(f"Output retention removed {deleted} files")
+        except Exception as e:
+            logger.error(f"Output retention failed: {str(e)}")
+        await asyncio.sleep(settings.RENDER_OUTPUT_RETENTION_INTERVAL_SECONDS)
@@ -1,17 +1,28 @@
 import uuid
 import time
+import asyncio
+from typing import AsyncIterator
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from app.models.template import Template
 from app.models.user import User
-from app.models.renderlog import RenderLog
-from app.core.s3 import get_file
+from app.services.template_cache import get_cached_template, get_cached_template_async, load_and_cache, load_and_cache_async
+from app.services.log_service import render_log_buffer
 from app.core.config import settings
-from app.utils.jinja_engine import render_html
-from app.utils.pdf_engine import html_to_pdf
+from app.core.metrics import timed_stage, in_flight, RENDERS_TOTAL, OUTPUT_BYTES_TOTAL, RENDER_STAGE_SECONDS
+from app.utils.jinja_engine import source_hash
+from app.utils.pdf_cache import make_render_key, get_cached_pdf, store_cached_pdf
+from app.utils.shared_styles import styles_fingerprint
+from app.utils.pdf_engine import render_template_pdf, render_pool, RenderQueueFullError, RenderTimeoutError
 
 
 def load_template_html(db: Session, template_id: uuid.UUID, owner: User) -> str:
+    cached = get_cached_template(db, template_id, owner.id)
+    if cached is not None:
+        return cached.html
+    
     template = db.query(Template).filter(
         Template.id == template_id,
         Template.owner_id == owner.id
@@ -23,44 +34,183 @@ def load_template_html(db: Session, template_id: uuid.UUID, owner: User) -> str:
             detail="Template not found"
         )
     
-    html_content = get_file(settings.S3_BUCKET, template.s3_path)
-    if html_content is None:
+    cached = load_and_cache(template.id, template.owner_id, template.s3_path)
+    if cached is None:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to load template file"
         )
     
-    return html_content.decode('utf-8')
+    return cached.html
 
 
-def render_template(
-    db: Session,
+async def load_template_html_async(db: AsyncSession, template_id: uuid.UUID, owner: User) -> str:
+    cached = await get_cached_template_async(db, template_id, owner.id)
+    if cached is not None:
+        return cached.html
+    
+    result = await db.execute(select(Template).filter(
+        Template.id == template_id,
+        Template.owner_id == owner.id
+    ))
+    template = result.scalars().first()
+    
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Template not found"
+        )
+    
+    cached = await load_and_cache_async(template.id, template.owner_id, template.s3_path)
+    if cached is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to load template file"
+        )
+    
+    return cached.html
+
+
+def template_hash(html_template: str) -> str:
+    """
+    Hash of the template source and the shared stylesheets it links, the
+    template part of the PDF cache key.
+    """
+    return source_hash(html_template) + styles_fingerprint(html_template)
+
+
+async def _render_in_pool(
+    html_template: str,
+    data: dict,
+    template_id: uuid.UUID,
+    pdf_identifier: bytes | None = None,
+    render_options: dict | None = None
+) -> bytes:
+    """
+    Jinja and WeasyPrint both run in a render worker; the Jinja time the
+    worker reports is split out so the stage metrics stay comparable.
+    """
+    start_time = time.perf_counter()
+    pdf_bytes, jinja_seconds = await render_template_pdf(html_template, data, template_id, pdf_identifier, render_options)
+    RENDER_STAGE_SECONDS.observe(jinja_seconds, stage="jinja", template=str(template_id))
+    RENDER_STAGE_SECONDS.observe(time.perf_counter() - start_time - jinja_seconds, stage="weasyprint", template=str(template_id))
+    return pdf_bytes
+
+
+async def get_render_etag(
+    db: AsyncSession,
+    template_id: uuid.UUID,
+    data: dict,
+    owner: User,
+    render_options: dict | None = None
+) -> str:
+    """
+    Content address of the PDF that rendering data with this template
+    produces; usable as an ETag without rendering.
+    """
+    html_template = await load_template_html_async(db, template_id, owner)
+    return make_render_key(template_hash(html_template), data, render_options)
+
+
+async def render_template(
+    db: AsyncSession,
     template_id: uuid.UUID,
     data: dict,
-    owner: User
+    owner: User,
+    render_options: dict | None = None
 ) -> bytes:
     start_time = time.time()
     status_result = "success"
     
     try:
-        html_template = load_template_html(db, template_id, owner)
-        
-        rendered_html = render_html(html_template, data)
-        
-        pdf_bytes = html_to_pdf(rendered_html)
-        
-        return pdf_bytes
+        with in_flight("pdf"):
+            with timed_stage("template_load", template_id):
+                html_template = await load_template_html_async(db, template_id, owner)
+                render_key = make_render_key(template_hash(html_template), data, render_options)
+            
+            with timed_stage("pdf_cache_lookup", template_id):
+                pdf_bytes = await asyncio.to_thread(get_cached_pdf, render_key)
+            if pdf_bytes is not None:
+                return pdf_bytes
+            
+            pdf_bytes = await _render_in_pool(html_template, data, template_id, bytes.fromhex(render_key[:32]), render_options)
+            OUTPUT_BYTES_TOTAL.inc(len(pdf_bytes), kind="pdf")
+            
+            await asyncio.to_thread(store_cached_pdf, render_key, pdf_bytes)
+            
+            return pdf_bytes
+    except RenderQueueFullError:
+        status_result = "rejected"
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Render queue is full, try again later",
+            headers={"Retry-After": "5"}
+        )
+    except RenderTimeoutError:
+        status_result = "timeout"
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Rendering timed out"
+        )
     except Exception as e:
         status_result = "error"
         raise e
     finally:
         duration_ms = int((time.time() - start_time) * 1000)
-        
-        log_entry = RenderLog(
-            template_id=template_id,
-            owner_id=owner.id,
-            duration_ms=duration_ms,
-            status=status_result
+        RENDERS_TOTAL.inc(status=status_result)
+        render_log_buffer.add(template_id, owner.id, duration_ms, status_result)
+
+
+async def render_batch(
+    db: AsyncSession,
+    template_id: uuid.UUID,
+    items: list[dict],
+    owner: User,
+    render_options: dict | None = None
+) -> AsyncIterator[tuple[int, bytes | Exception]]:
+    """
+    Render one PDF per data payload. The template is loaded once up front
+    (so a missing template still fails the request); the returned async
+    iterator yields (index, PDF or exception) in input order as renders
+    complete, and each row's log is queued for the bulk insert.
+    """
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch exceeds the maximum of {settings.BATCH_MAX_ITEMS} items"
         )
-        db.add(log_entry)
-        db.commit()
+    
+    with timed_stage("template_load", template_id):
+        html_template = await load_template_html_async(db, template_id, owner)
+    
+    async def render_row(data: dict) -> bytes | Exception:
+        start_time = time.time()
+        try:
+            with in_flight("batch"):
+                result = await _render_in_pool(html_template, data, template_id, None, render_options)
+            OUTPUT_BYTES_TOTAL.inc(len(result), kind="pdf")
+            status_result = "success"
+        except Exception as e:
+            result = e
+            status_result = "error"
+        RENDERS_TOTAL.inc(status=status_result)
+        render_log_buffer.add(template_id, owner.id, int((time.time() - start_time) * 1000), status_result)
+        return result
+    
+    async def results() -> AsyncIterator[tuple[int, bytes | Exception]]:
+        # Keep at most one job per worker in flight so a batch never fills
+        # the shared queue and starves interactive renders; finished PDFs
+        # wait only until the rows before them are out.
+        window = max(render_pool.workers, 1)
+        pending = {}
+        try:
+            for index in range(len(items)):
+                while len(pending) < window and index + len(pending) < len(items):
+                    next_index = index + len(pending)
+                    pending[next_index] = asyncio.create_task(render_row(items[next_index]))
+                yield index, await pending.pop(index)
+        finally:
+            for task in pending.values():
+                task.cancel()
+    
+    return results()
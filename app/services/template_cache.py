@@ -0,0 +1,175 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from app.core import invalidation
+from app.core.config import settings
+from app.core.s3 import get_file, head_file, get_file_async, head_file_async
+from app.utils.jinja_engine import invalidate_template
+
+TEMPLATE_SCOPE = "template"
+
+
+class CachedTemplate:
+    __slots__ = ("template_id", "owner_id", "s3_path", "html", "etag", "checked_at")
+    
+    def __init__(self, template_id, owner_id: int, s3_path: str, html: str, etag: str | None):
+        self.template_id = template_id
+        self.owner_id = owner_id
+        self.s3_path = s3_path
+        self.html = html
+        self.etag = etag
+        self.checked_at = time.monotonic()
+    
+    @property
+    def size(self) -> int:
+        return len(self.html) + len(self.s3_path)
+
+
+class TemplateSourceCache:
+    """
+    LRU cache of template metadata and decoded HTML, bounded by total size.
+    Entries older than the TTL are revalidated with a storage HEAD (ETag)
+    and only re-downloaded when the object actually changed.
+    """
+    
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedTemplate]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidations": 0, "reloads": 0, "evictions": 0}
+    
+    def get(self, template_id) -> CachedTemplate | None:
+        with self._lock:
+            entry = self._entries.get(str(template_id))
+            if entry is not None:
+                self._entries.move_to_end(str(template_id))
+            return entry
+    
+    def put(self, entry: CachedTemplate) -> None:
+        if entry.size > self.max_bytes:
+            return
+        key = str(entry.template_id)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.stats["evictions"] += 1
+    
+    def evict(self, template_id) -> None:
+        with self._lock:
+            old = self._entries.pop(str(template_id), None)
+            if old is not None:
+                self._bytes -= old.size
+    
+    def is_fresh(self, entry: CachedTemplate) -> bool:
+        return time.monotonic() - entry.checked_at < self.ttl_seconds
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+template_cache = TemplateSourceCache(
+    max_bytes=settings.TEMPLATE_CACHE_MAX_BYTES,
+    ttl_seconds=settings.TEMPLATE_CACHE_TTL_SECONDS
+)
+
+
+def _on_template_invalidated(key: str) -> None:
+    template_cache.evict(key)
+    invalidate_template(key)
+
+
+invalidation.subscribe(TEMPLATE_SCOPE, _on_template_invalidated)
+
+
+def invalidate_template_source(db: Session, template_id: uuid.UUID) -> None:
+    """
+    Drop a template from the caches of this process and of every replica.
+    Call before committing the session that changes the template.
+    """
+    invalidation.publish(db, TEMPLATE_SCOPE, template_id)
+
+
+def _lookup(template_id: uuid.UUID, owner_id: int) -> CachedTemplate | tuple | None:
+    """
+    The cached entry if it is fresh, None on a miss, or the stale entry
+    wrapped in a tuple when it needs an ETag revalidation.
+    """
+    entry = template_cache.get(template_id)
+    if entry is None or entry.owner_id != owner_id:
+        template_cache.stats["misses"] += 1
+        return None
+    
+    if template_cache.is_fresh(entry):
+        template_cache.stats["hits"] += 1
+        return entry
+    
+    return (entry,)
+
+
+def _revalidate(entry: CachedTemplate, etag: str | None) -> CachedTemplate | None:
+    if etag is not None and etag == entry.etag:
+        template_cache.stats["revalidations"] += 1
+        entry.checked_at = time.monotonic()
+        return entry
+    
+    template_cache.stats["reloads"] += 1
+    template_cache.evict(entry.template_id)
+    return None
+
+
+def get_cached_template(db: Session, template_id: uuid.UUID, owner_id: int) -> CachedTemplate | None:
+    """
+    Return the cached template if it belongs to owner_id and is still
+    current, revalidating expired entries by ETag. Returns None on a miss.
+    """
+    invalidation.poll(db)
+    
+    found = _lookup(template_id, owner_id)
+    if isinstance(found, tuple):
+        return _revalidate(found[0], head_file(settings.S3_BUCKET, found[0].s3_path))
+    return found
+
+
+async def get_cached_template_async(db, template_id: uuid.UUID, owner_id: int) -> CachedTemplate | None:
+    """
+    get_cached_template() for an AsyncSession, with non-blocking storage I/O.
+    """
+    await invalidation.poll_async(db)
+    
+    found = _lookup(template_id, owner_id)
+    if isinstance(found, tuple):
+        return _revalidate(found[0], await head_file_async(settings.S3_BUCKET, found[0].s3_path))
+    return found
+
+
+def load_and_cache(template_id: uuid.UUID, owner_id: int, s3_path: str) -> CachedTemplate | None:
+    etag = head_file(settings.S3_BUCKET, s3_path)
+    html_content = get_file(settings.S3_BUCKET, s3_path)
+    if html_content is None:
+        return None
+    
+    entry = CachedTemplate(template_id, owner_id, s3_path, html_content.decode('utf-8'), etag)
+    template_cache.put(entry)
+    return entry
+
+
+async def load_and_cache_async(template_id: uuid.UUID, owner_id: int, s3_path: str) -> CachedTemplate | None:
+    etag = await head_file_async(settings.S3_BUCKET, s3_path)
+    html_content = await get_file_async(settings.S3_BUCKET, s3_path)
+    if html_content is None:
+        return None
+    
+    entry = CachedTemplate(template_id, owner_id, s3_path, html_content.decode('utf-8'), etag)
+    template_cache.put(entry)
+    return entry
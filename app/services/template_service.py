@@ -5,6 +5,8 @@ from app.models.template import Template
 from app.models.user import User
 from app.core.s3 import upload_file, get_file, delete_file
 from app.core.config import settings
+from app.services.template_cache import invalidate_template_source
+from app.utils.jinja_engine import precompile_template
 
 
 def create_template(
@@ -36,6 +38,7 @@ def create_template(
     db.add(template)
     db.commit()
     db.refresh(template)
+    precompile_template(content)
     return template
 
 
@@ -81,9 +84,12 @@ def update_template(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to update template file"
             )
+        invalidate_template_source(db, template.id)
     
     db.commit()
     db.refresh(template)
+    if content:
+        precompile_template(content)
     return template
 
 
@@ -91,6 +97,7 @@ def delete_template(db: Session, template_id: uuid.UUID, owner: User) -> bool:
     template = get_template(db, template_id, owner)
     
     delete_file(settings.S3_BUCKET, template.s3_path)
+    invalidate_template_source(db, template.id)
     
     db.delete(template)
     db.commit()
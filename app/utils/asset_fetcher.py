@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlsplit
+from app.core.config import settings
+from app.core.s3 import LOCAL_STORAGE_PATH, get_file
+
+logger = logging.getLogger(__name__)
+
+# Assets in our own bucket are referenced as storage:<key> (or s3:<key>).
+STORAGE_SCHEMES = ("storage", "s3")
+
+
+class AssetFetchError(Exception):
+    """Exception raised when an asset is blocked, over budget or unavailable."""
+    pass
+
+
+class CachedAsset:
+    __slots__ = ("body", "mime_type", "encoding", "redirected_url", "fetched_at")
+    
+    def __init__(self, body: bytes | None, mime_type: str | None, encoding: str | None,
+                 redirected_url: str | None, fetched_at: float):
+        self.body = body
+        self.mime_type = mime_type
+        self.encoding = encoding
+        self.redirected_url = redirected_url
+        self.fetched_at = fetched_at
+    
+    @property
+    def size(self) -> int:
+        return len(self.body or b"")
+    
+    def as_weasyprint(self, url: str) -> dict:
+        return {
+            "string": self.body,
+            "mime_type": self.mime_type,
+            "encoding": self.encoding,
+            "redirected_url": self.redirected_url or url
+        }
+
+
+class AssetCache:
+    """
+    Fetched template assets (images, CSS, fonts) kept in a size-bounded
+    in-memory LRU, backed by a shared on-disk cache so every render worker
+    benefits from a fetch done by another. Failed fetches are cached as
+    entries with no body for a shorter TTL.
+    """
+    
+    def __init__(self, directory: str, memory_bytes: int, disk_bytes: int, ttl: float, negative_ttl: float):
+        self.directory = Path(directory)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, CachedAsset]" = OrderedDict()
+        self._bytes = 0
+        self._disk_total = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "failures": 0}
+    
+    def _paths(self, url: str) -> tuple[Path, Path]:
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = self.directory / digest[:2] / digest
+        return base.with_suffix(".bin"), base.with_suffix(".json")
+    
+    def _is_fresh(self, asset: CachedAsset) -> bool:
+        ttl = self.ttl if asset.body is not None else self.negative_ttl
+        return time.time() - asset.fetched_at < ttl
+    
+    def _remember(self, url: str, asset: CachedAsset) -> None:
+        if asset.size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[url] = asset
+            self._bytes += asset.size
+            while self._bytes > self.memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+    
+    def get(self, url: str) -> CachedAsset | None:
+        with self._lock:
+            asset = self._entries.get(url)
+            if asset is not None and self._is_fresh(asset):
+                self._entries.move_to_end(url)
+                self.stats["memory_hits"] += 1
+                return asset
+        
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            body = body_path.read_bytes() if meta["ok"] else None
+        except (OSError, ValueError, KeyError):
+            self.stats["misses"] += 1
+            return None
+        
+        asset = CachedAsset(body, meta.get("mime_type"), meta.get("encoding"), meta.get("redirected_url"), meta["fetched_at"])
+        if not self._is_fresh(asset):
+            self.stats["misses"] += 1
+            return None
+        
+        self.stats["disk_hits"] += 1
+        self._remember(url, asset)
+        return asset
+    
+    def put(self, url: str, asset: CachedAsset) -> None:
+        self._remember(url, asset)
+        
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "ok": asset.body is not None,
+            "mime_type": asset.mime_type,
+            "encoding": asset.encoding,
+            "redirected_url": asset.redirected_url,
+            "fetched_at": asset.fetched_at
+        }
+        try:
+            body_path.parent.mkdir(parents=True, exist_ok=True)
+            if asset.body is not None:
+                tmp_path = body_path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.write_bytes(asset.body)
+                os.replace(tmp_path, body_path)
+            tmp_path = meta_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            logger.warning(f"Could not write asset cache entry: {str(e)}")
+            return
+        
+        self._account_disk(asset.size)
+    
+    def _scan_disk(self) -> list[tuple[float, int, Path]]:
+        files = []
+        for path in self.directory.glob("*/*.bin"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+    
+    def _account_disk(self, added: int) -> None:
+        with self._lock:
+            if self._disk_total is None:
+                self._disk_total = sum(size for _, size, _ in self._scan_disk())
+            else:
+                self._disk_total += added
+            if self._disk_total <= self.disk_bytes:
+                return
+            
+            # Evict least recently written bodies until back at 90% of the cap.
+            files = sorted(self._scan_disk())
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.disk_bytes * 0.9:
+                    break
+                try:
+                    path.unlink()
+                    path.with_suffix(".json").unlink(missing_ok=True)
+                    total -= size
+                except OSError:
+                    continue
+            self._disk_total = total
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries), "bytes": self._bytes}
+
+
+asset_cache = AssetCache(
+    directory=os.path.join(LOCAL_STORAGE_PATH, "asset_cache"),
+    memory_bytes=settings.ASSET_CACHE_MEMORY_BYTES,
+    disk_bytes=settings.ASSET_CACHE_DISK_BYTES,
+    ttl=settings.ASSET_CACHE_TTL_SECONDS,
+    negative_ttl=settings.ASSET_NEGATIVE_CACHE_TTL_SECONDS
+)
+
+
+def is_allowed(url: str) -> bool:
+    """
+    data: URLs and our storage scheme are always allowed; http(s) hosts
+    must match ASSET_ALLOWED_HOSTS ("*" allows any host, ".example.com"
+    allows subdomains). Everything else, including file:, is refused.
+    """
+    parts = urlsplit(url)
+    if parts.scheme in ("data",) + STORAGE_SCHEMES:
+        return True
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    
+    host = parts.hostname.lower()
+    for allowed in settings.ASSET_ALLOWED_HOSTS.split(","):
+        allowed = allowed.strip().lower()
+        if allowed == "*" or host == allowed or (allowed.startswith(".") and host.endswith(allowed)):
+            return True
+    return False
+
+
+def _fetch_storage(url: str) -> CachedAsset:
+    key = urlsplit(url).path.lstrip("/")
+    if not key.startswith(settings.ASSET_STORAGE_PREFIX):
+        raise AssetFetchError(f"Storage assets must live under {settings.ASSET_STORAGE_PREFIX}")
+    body = get_file(settings.S3_BUCKET, key)
+    if body is None:
+        raise AssetFetchError(f"Asset {key} not found in storage")
+    return CachedAsset(body, mimetypes.guess_type(key)[0], None, url, time.time())
+
+
+def _fetch_remote(url: str, timeout: float) -> CachedAsset:
+    from weasyprint import default_url_fetcher
+    
+    result = default_url_fetcher(url, timeout=timeout)
+    body = result.get("string")
+    file_obj = result.get("file_obj")
+    if file_obj is not None:
+        try:
+            body = file_obj.read(settings.ASSET_MAX_BYTES + 1)
+        finally:
+            file_obj.close()
+    if isinstance(body, str):
+        body = body.encode(result.get("encoding") or "utf-8")
+    if body is not None and len(body) > settings.ASSET_MAX_BYTES:
+        raise AssetFetchError(f"Asset {url} exceeds {settings.ASSET_MAX_BYTES} bytes")
+    return CachedAsset(body, result.get("mime_type"), result.get("encoding"), result.get("redirected_url"), time.time())
+
+
+def make_url_fetcher(budget_seconds: float | None = None, max_image_pixels: int | None = None,
+                     jpeg_quality: int | None = None):
+    """
+    Build a WeasyPrint url_fetcher for one render. Network time spent on
+    cache misses is capped by budget_seconds; once it is used up, further
+    uncached assets fail fast and WeasyPrint renders without them. With
+    max_image_pixels, larger images are downsampled before decoding.
+    """
+    budget = settings.ASSET_FETCH_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+    deadline = time.monotonic() + budget
+    
+    def fetch(url: str, timeout: float, ssl_context, **kwargs) -> dict:
+        if url.startswith("data:"):
+            from weasyprint import default_url_fetcher
+            return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context, **kwargs)
+        
+        if not is_allowed(url):
+            raise AssetFetchError(f"Asset URL not allowed: {url}")
+        
+        cached = asset_cache.get(url)
+        if cached is not None:
+            if cached.body is None:
+                raise AssetFetchError(f"Asset {url} failed recently")
+            return cached.as_weasyprint(url)
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise AssetFetchError(f"Asset fetch budget exhausted, skipping {url}")
+        
+        try:
+            if urlsplit(url).scheme in STORAGE_SCHEMES:
+                asset = _fetch_storage(url)
+            else:
+                asset = _fetch_remote(url, min(settings.ASSET_FETCH_TIMEOUT_SECONDS, remaining))
+        except Exception as e:
+            asset_cache.stats["failures"] += 1
+            asset_cache.put(url, CachedAsset(None, None, None, None, time.time()))
+            raise AssetFetchError(f"Fetching {url} failed: {str(e)}")
+        
+        asset_cache.put(url, asset)
+        return asset.as_weasyprint(url)
+    
+    def url_fetcher(url: str, timeout: float = 10, ssl_context=None, **kwargs) -> dict:
+        result = fetch(url, timeout, ssl_context, **kwargs)
+        if max_image_pixels and isinstance(result.get("string"), bytes):
+            from app.utils.image_pipeline import downsample
+            result = {**result, "string": downsample(result["string"], result.get("mime_type"), max_image_pixels, jpeg_quality)}
+        return result
+    
+    return url_fetcher
@@ -0,0 +1,66 @@
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+
+class ImageIndex:
+    """
+    SQLite index of generated image files by creation time and size, so
+    retention never has to list or stat the image directory. Safe to share
+    between processes on the same volume (WAL mode).
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+    
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "name TEXT PRIMARY KEY, created_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_files_created_at ON files (created_at)")
+            self._local.conn = conn
+        return conn
+    
+    def record(self, name: str, size: int) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO files (name, created_at, size) VALUES (?, ?, ?)",
+            (name, time.time(), size)
+        )
+    
+    def touch(self, names: Iterable[str]) -> None:
+        now = time.time()
+        self._connection().executemany(
+            "UPDATE files SET created_at = ? WHERE name = ?",
+            [(now, name) for name in names]
+        )
+    
+    def remove(self, names: Iterable[str]) -> None:
+        self._connection().executemany("DELETE FROM files WHERE name = ?", [(name,) for name in names])
+    
+    def total_size(self) -> int:
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+    
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    
+    def older_than(self, cutoff: float, limit: int) -> List[Tuple[str, int]]:
+        return self._connection().execute(
+            "SELECT name, size FROM files WHERE created_at < ? ORDER BY created_at LIMIT ?",
+            (cutoff, limit)
+        ).fetchall()
+    
+    def oldest(self, limit: int) -> List[Tuple[str, int]]:
+        return self._connection().execute(
+            "SELECT name, size FROM files ORDER BY created_at LIMIT ?",
+            (limit,)
+        ).fetchall()
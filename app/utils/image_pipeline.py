@@ -0,0 +1,123 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from io import BytesIO
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DOWNSAMPLE_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+
+
+class BoundedImageCache(MutableMapping):
+    """
+    LRU mapping handed to WeasyPrint as its image cache, so decoded images
+    are reused across renders in a worker without growing without bound.
+    WeasyPrint keys it by URL, so entries expire after ttl_seconds (the
+    asset cache TTL) and a changed image at the same URL is picked up.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __getitem__(self, key):
+        with self._lock:
+            expires_at, value = self._entries[key]
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                raise KeyError(key)
+            self._entries.move_to_end(key)
+            return value
+    
+    def __setitem__(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __delitem__(self, key) -> None:
+        with self._lock:
+            del self._entries[key]
+    
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+image_cache = BoundedImageCache(settings.RENDER_IMAGE_CACHE_ENTRIES, settings.ASSET_CACHE_TTL_SECONDS)
+
+_downsampled: "OrderedDict[tuple, bytes]" = OrderedDict()
+_downsampled_bytes = 0
+_downsample_lock = threading.Lock()
+
+
+def max_image_pixels(dpi: int) -> int:
+    """
+    Longest side an image can usefully have at dpi when it spans at most
+    RENDER_IMAGE_MAX_INCHES (a full page width) of the output.
+    """
+    return int(settings.RENDER_IMAGE_MAX_INCHES * dpi)
+
+
+def _resize(body: bytes, image_format: str, max_pixels: int, jpeg_quality: int) -> bytes | None:
+    from PIL import Image, ImageOps
+    
+    with Image.open(BytesIO(body)) as image:
+        if max(image.size) <= max_pixels:
+            return None
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+        output = BytesIO()
+        if image_format == "JPEG":
+            image.convert("RGB").save(output, "JPEG", quality=jpeg_quality, optimize=True)
+        else:
+            image.save(output, image_format, optimize=True)
+        return output.getvalue()
+
+
+def downsample(body: bytes, mime_type: str | None, max_pixels: int, jpeg_quality: int | None = None) -> bytes:
+    """
+    Shrink an image whose longest side exceeds max_pixels. Results are
+    cached by content hash, so each distinct image is resized once per
+    worker whatever URL it came from. Anything else is returned unchanged.
+    """
+    global _downsampled_bytes
+    
+    image_format = DOWNSAMPLE_FORMATS.get((mime_type or "").split(";")[0].strip().lower())
+    if image_format is None or not body:
+        return body
+    
+    quality = jpeg_quality or settings.RENDER_JPEG_QUALITY
+    key = (hashlib.sha256(body).hexdigest(), max_pixels, quality)
+    with _downsample_lock:
+        cached = _downsampled.get(key)
+        if cached is not None:
+            _downsampled.move_to_end(key)
+            return cached
+    
+    try:
+        resized = _resize(body, image_format, max_pixels, quality)
+    except Exception as e:
+        logger.warning(f"Could not downsample image: {str(e)}")
+        resized = None
+    if resized is None or len(resized) >= len(body):
+        resized = body
+    
+    with _downsample_lock:
+        if key not in _downsampled and len(resized) <= settings.RENDER_IMAGE_DOWNSAMPLE_CACHE_BYTES:
+            _downsampled[key] = resized
+            _downsampled_bytes += len(resized)
+            while _downsampled_bytes > settings.RENDER_IMAGE_DOWNSAMPLE_CACHE_BYTES:
+                _, evicted = _downsampled.popitem(last=False)
+                _downsampled_bytes -= len(evicted)
+    return resized
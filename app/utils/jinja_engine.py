@@ -1,8 +1,140 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 from jinja2 import Template, Environment, BaseLoader
+from jinja2.bccache import BytecodeCache, Bucket, FileSystemBytecodeCache
 from typing import Dict, Any
+from app.core.config import settings
+from app.core.s3 import get_file, upload_file
 
+logger = logging.getLogger(__name__)
 
-def render_html(html_str: str, data_dict: Dict[str, Any]) -> str:
-    env = Environment(loader=BaseLoader())
-    template = env.from_string(html_str)
+_env = Environment(loader=BaseLoader())
+
+
+class StorageBytecodeCache(BytecodeCache):
+    """
+    Jinja bytecode kept in the storage backend, shared by every replica.
+    """
+    
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+    
+    def load_bytecode(self, bucket: Bucket) -> None:
+        data = get_file(settings.S3_BUCKET, f"{self.prefix}/{bucket.key}")
+        if data is not None:
+            bucket.bytecode_from_string(data)
+    
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        upload_file(settings.S3_BUCKET, f"{self.prefix}/{bucket.key}", bucket.bytecode_to_string())
+
+
+def _create_bytecode_cache() -> BytecodeCache | None:
+    backend = settings.JINJA_BYTECODE_CACHE
+    if backend == "disk":
+        os.makedirs(settings.JINJA_BYTECODE_CACHE_DIR, exist_ok=True)
+        return FileSystemBytecodeCache(settings.JINJA_BYTECODE_CACHE_DIR)
+    if backend == "storage":
+        return StorageBytecodeCache("jinja_bytecode")
+    return None
+
+
+_bytecode_cache = _create_bytecode_cache()
+
+_cache: "OrderedDict[tuple, Template]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def source_hash(html_str: str) -> str:
+    return hashlib.sha256(html_str.encode('utf-8')).hexdigest()
+
+
+def _compile(html_str: str, content_hash: str) -> Template:
+    """
+    Compile through the bytecode cache: a cold worker loads code compiled
+    by any other worker for the same source instead of recompiling it.
+    Bucket headers carry the Jinja and Python versions, so stale entries
+    are ignored.
+    """
+    if _bytecode_cache is None:
+        return _env.from_string(html_str)
+    
+    bucket = Bucket(_env, content_hash, content_hash)
+    try:
+        _bytecode_cache.load_bytecode(bucket)
+    except Exception as e:
+        logger.warning(f"Loading Jinja bytecode failed: {str(e)}")
+    
+    code = bucket.code
+    if code is None:
+        code = _env.compile(html_str)
+        bucket.code = code
+        try:
+            _bytecode_cache.dump_bytecode(bucket)
+        except Exception as e:
+            logger.warning(f"Storing Jinja bytecode failed: {str(e)}")
+    
+    return _env.template_class.from_code(_env, code, _env.make_globals(None))
+
+
+def precompile_template(html_str: str) -> bool:
+    """
+    Compile a template into the bytecode cache ahead of its first render.
+    Returns False if the source does not compile.
+    """
+    try:
+        _compile(html_str, source_hash(html_str))
+        return True
+    except Exception as e:
+        logger.warning(f"Precompiling template failed: {str(e)}")
+        return False
+
+
+def get_compiled_template(html_str: str, template_id=None) -> Template:
+    """
+    Return the compiled Jinja template for html_str, compiling it only once.
+    Entries are keyed by (template_id, content hash) and evicted LRU.
+    """
+    key = (str(template_id) if template_id is not None else None, source_hash(html_str))
+    
+    with _cache_lock:
+        template = _cache.get(key)
+        if template is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return template
+        _stats["misses"] += 1
+    
+    template = _compile(html_str, key[1])
+    
+    with _cache_lock:
+        _cache[key] = template
+        _cache.move_to_end(key)
+        while len(_cache) > settings.JINJA_CACHE_SIZE:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+    
+    return template
+
+
+def invalidate_template(template_id) -> None:
+    """
+    Drop every compiled version of a template, e.g. after its source changed.
+    """
+    template_key = str(template_id)
+    with _cache_lock:
+        for key in [k for k in _cache if k[0] == template_key]:
+            del _cache[key]
+
+
+def get_cache_stats() -> dict:
+    with _cache_lock:
+        return {**_stats, "size": len(_cache), "max_size": settings.JINJA_CACHE_SIZE}
+
+
+def render_html(html_str: str, data_dict: Dict[str, Any], template_id=None) -> str:
+    template = get_compiled_template(html_str, template_id)
     return template.render(**data_dict)
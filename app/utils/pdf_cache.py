@@ -0,0 +1,167 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from app.core.config import settings
+from app.core.s3 import LOCAL_STORAGE_PATH, get_file, upload_file
+
+logger = logging.getLogger(__name__)
+
+# Bump when a change to the render pipeline alters the produced bytes.
+RENDER_CACHE_VERSION = "2"
+
+
+def canonical_json(data) -> str:
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def make_render_key(template_hash: str, data: dict, render_options: dict | None = None) -> str:
+    """
+    Content address of a render: identical template source, data and
+    render options (regardless of key order) always map to the same key.
+    """
+    payload = f"{RENDER_CACHE_VERSION}\n{template_hash}\n{canonical_json(data)}"
+    if render_options:
+        payload += f"\n{canonical_json(render_options)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskPDFCache:
+    """
+    Rendered PDFs stored under the local storage area, capped at max_bytes
+    with least-recently-used eviction.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._load_index()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pdf"
+    
+    def _load_index(self) -> None:
+        if not self.directory.exists():
+            return
+        files = []
+        for path in self.directory.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_atime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self._bytes += size
+    
+    def get(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                size = self._index.pop(key, None)
+                if size is not None:
+                    self._bytes -= size
+            return None
+        
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+    
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        evicted = []
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old
+            self._index[key] = len(data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and self._index:
+                old_key, size = self._index.popitem(last=False)
+                self._bytes -= size
+                evicted.append(old_key)
+        
+        for old_key in evicted:
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+
+class S3PDFCache:
+    """
+    Rendered PDFs stored in the template bucket under pdf_cache/.
+    Expiry is left to a bucket lifecycle rule on that prefix.
+    """
+    
+    def __init__(self, bucket: str, prefix: str = "pdf_cache"):
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def get(self, key: str) -> bytes | None:
+        return get_file(self.bucket, f"{self.prefix}/{key[:2]}/{key}.pdf")
+    
+    def put(self, key: str, data: bytes) -> None:
+        upload_file(self.bucket, f"{self.prefix}/{key[:2]}/{key}.pdf", data)
+
+
+def _create_cache():
+    backend = settings.PDF_CACHE_BACKEND
+    if backend == "disk":
+        return DiskPDFCache(os.path.join(LOCAL_STORAGE_PATH, "pdf_cache"), settings.PDF_CACHE_MAX_BYTES)
+    if backend == "s3":
+        return S3PDFCache(settings.S3_BUCKET)
+    return None
+
+
+pdf_cache = _create_cache()
+_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+def get_cached_pdf(key: str) -> bytes | None:
+    if pdf_cache is None:
+        return None
+    try:
+        data = pdf_cache.get(key)
+    except Exception as e:
+        logger.error(f"PDF cache read failed: {str(e)}")
+        _stats["errors"] += 1
+        return None
+    _stats["hits" if data is not None else "misses"] += 1
+    return data
+
+
+def store_cached_pdf(key: str, data: bytes) -> None:
+    if pdf_cache is None:
+        return
+    try:
+        pdf_cache.put(key, data)
+    except Exception as e:
+        logger.error(f"PDF cache write failed: {str(e)}")
+        _stats["errors"] += 1
+
+
+def get_cache_stats() -> dict:
+    return {**_stats, "backend": settings.PDF_CACHE_BACKEND}
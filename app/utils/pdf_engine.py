@@ -1,10 +1,347 @@
-from weasyprint import HTML
+import os
+import time
+import signal
+import asyncio
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from io import BytesIO
+from app.core.config import settings
+from app.utils.asset_fetcher import make_url_fetcher
+from app.utils.image_pipeline import image_cache, max_image_pixels
+from app.utils.shared_styles import extract_shared_styles, preload_stylesheets
 
+logger = logging.getLogger(__name__)
 
-def html_to_pdf(html_content: str) -> bytes:
-    html = HTML(string=html_content)
+WARMUP_HTML = "<html><body><h1>Warm-up</h1><p>Render worker ready.</p></body></html>"
+
+
+class RenderQueueFullError(Exception):
+    """Exception raised when the render queue has no free slots."""
+    pass
+
+
+class RenderTimeoutError(Exception):
+    """Exception raised when a render job exceeds its timeout."""
+    pass
+
+
+def html_to_pdf(html_content: str, pdf_identifier: bytes | None = None, render_options: dict | None = None) -> bytes:
+    """
+    render_options may set dpi, jpeg_quality and optimize_images; unset
+    values fall back to RENDER_IMAGE_DPI and RENDER_JPEG_QUALITY.
+    """
+    from weasyprint import HTML
+    
+    render_options = render_options or {}
+    dpi = render_options.get("dpi") or settings.RENDER_IMAGE_DPI
+    jpeg_quality = render_options.get("jpeg_quality") or settings.RENDER_JPEG_QUALITY
+    
+    html_content, stylesheets, font_config = extract_shared_styles(html_content)
+    url_fetcher = make_url_fetcher(
+        max_image_pixels=max_image_pixels(dpi) if dpi else None,
+        jpeg_quality=jpeg_quality
+    )
+    html = HTML(string=html_content, url_fetcher=url_fetcher)
     pdf_buffer = BytesIO()
-    html.write_pdf(pdf_buffer)
+    # Shared stylesheets come pre-parsed and, unless the document brings
+    # fonts of its own, use the process-wide font configuration instead of
+    # being re-read on every render.
+    options = {
+        "stylesheets": stylesheets,
+        "font_config": font_config,
+        "jpeg_quality": jpeg_quality,
+        "optimize_images": bool(render_options.get("optimize_images"))
+    }
+    if dpi:
+        options["dpi"] = dpi
+    if not render_options:
+        # WeasyPrint keys its image cache by URL only, so it is shared
+        # between renders that use the default image settings.
+        options["cache"] = image_cache
+    if pdf_identifier is not None:
+        # A fixed /ID keeps the output byte-identical for identical inputs.
+        options["pdf_identifier"] = pdf_identifier
+    html.write_pdf(pdf_buffer, **options)
     pdf_buffer.seek(0)
     return pdf_buffer.read()
+
+
+def merge_pdfs(documents: list[tuple[str, bytes]]) -> bytes:
+    """
+    Concatenate PDFs into one document with a top-level bookmark per input.
+    """
+    from pypdf import PdfWriter
+    
+    writer = PdfWriter()
+    for title, pdf_bytes in documents:
+        writer.append(BytesIO(pdf_bytes), outline_item=title)
+    
+    pdf_buffer = BytesIO()
+    writer.write(pdf_buffer)
+    writer.close()
+    return pdf_buffer.getvalue()
+
+
+def render_document(
+    html_template: str,
+    data: dict,
+    template_id=None,
+    pdf_identifier: bytes | None = None,
+    render_options: dict | None = None
+) -> tuple[bytes, float]:
+    """
+    Jinja and WeasyPrint as one pool job, so templates are rendered in the
+    workers instead of on the event loop. Returns the PDF and the seconds
+    spent in Jinja.
+    """
+    from app.utils.jinja_engine import render_html
+    
+    start_time = time.perf_counter()
+    rendered_html = render_html(html_template, data, template_id)
+    jinja_seconds = time.perf_counter() - start_time
+    return html_to_pdf(rendered_html, pdf_identifier, render_options), jinja_seconds
+
+
+def _warm_up_worker():
+    """
+    Runs once in every worker process: loads WeasyPrint, fonts and the
+    layout engine so the first real job does not pay for it.
+    """
+    try:
+        preload_stylesheets()
+        html_to_pdf(WARMUP_HTML)
+    except Exception as e:
+        logger.error(f"Render worker warm-up failed: {str(e)}")
+
+
+class _RenderWorker:
+    """
+    One render process (a thread with workers=0) and the job it runs.
+    """
+    
+    def __init__(self, executor, pid):
+        self.executor = executor
+        self.pid = pid
+        self.job = None
+    
+    def kill(self) -> None:
+        """
+        Stop the process, e.g. one stuck in a render that timed out. A
+        thread cannot be stopped; it is left to finish on its own.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.pid is None or not self.pid.done() or self.pid.exception() is not None:
+            return
+        try:
+            os.kill(self.pid.result(), signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class RenderPool:
+    """
+    Pool of pre-warmed render processes with a bounded number of pending
+    jobs. With workers=0 jobs run in a thread inside this process.
+    
+    Every worker has its own single-process executor, so a job that runs
+    past the timeout only costs its own worker: that process is killed
+    and replaced while jobs on the other workers carry on.
+    """
+    
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max(workers, 1) + queue_size
+        self.timeout = timeout
+        self._started = False
+        self._workers = set()
+        self._idle = []
+        self._queue = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def pending(self) -> int:
+        return self._pending
+    
+    def _spawn(self) -> _RenderWorker:
+        if self.workers > 0:
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up_worker
+            )
+            # Starts the process right away and tells us which one it is.
+            return _RenderWorker(executor, executor.submit(os.getpid))
+        return _RenderWorker(ThreadPoolExecutor(max_workers=1, thread_name_prefix="render"), None)
+    
+    def _add_worker(self) -> None:
+        worker = self._spawn()
+        with self._lock:
+            if self._started:
+                self._workers.add(worker)
+                self._idle.append(worker)
+                return
+        worker.executor.shutdown(wait=False)
+    
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(max(self.workers, 1)):
+            self._add_worker()
+    
+    async def warm_up(self) -> None:
+        """
+        Render a small document on each worker and wait for all of them,
+        so fonts and the layout engine are loaded before traffic arrives.
+        """
+        self.start()
+        await asyncio.gather(*(self.run(html_to_pdf, WARMUP_HTML) for _ in range(max(self.workers, 1))))
+    
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            workers = list(self._workers)
+            queued = list(self._queue)
+            self._started = False
+            self._workers.clear()
+            self._idle.clear()
+            self._queue.clear()
+        
+        for future, _, _ in queued:
+            future.cancel()
+        for worker in workers:
+            worker.executor.shutdown(wait=wait, cancel_futures=True)
+    
+    def _release(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+    
+    def _dispatch(self) -> None:
+        """
+        Hand queued jobs to idle workers. The timeout starts when a worker
+        picks the job up.
+        """
+        while True:
+            with self._lock:
+                if not self._idle or not self._queue:
+                    return
+                future, fn, args = self._queue.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                worker = self._idle.pop()
+                worker.job = future
+            
+            try:
+                job = worker.executor.submit(fn, *args)
+            except Exception as e:
+                self._retire(worker, future)
+                future.set_exception(e)
+                continue
+            
+            timer = threading.Timer(self.timeout, self._expire, (worker, future))
+            timer.daemon = True
+            timer.start()
+            job.add_done_callback(partial(self._finish, worker, future, timer))
+    
+    def _claim(self, worker: _RenderWorker, future) -> bool:
+        """
+        The job finishing and its timer firing race each other; only the
+        first one to claim the worker acts on it.
+        """
+        with self._lock:
+            if worker.job is not future:
+                return False
+            worker.job = None
+            return True
+    
+    def _retire(self, worker: _RenderWorker, future) -> None:
+        with self._lock:
+            if worker.job is future:
+                worker.job = None
+            retired = worker in self._workers
+            self._workers.discard(worker)
+        
+        worker.kill()
+        if retired:
+            self._add_worker()
+    
+    def _finish(self, worker: _RenderWorker, future, timer, job) -> None:
+        timer.cancel()
+        if not self._claim(worker, future):
+            return
+        
+        error = RenderTimeoutError("Render job was cancelled") if job.cancelled() else job.exception()
+        if isinstance(error, BrokenProcessPool):
+            logger.error("Render worker died, starting a new one")
+            self._retire(worker, future)
+        else:
+            with self._lock:
+                if worker in self._workers:
+                    self._idle.append(worker)
+        
+        if error is None:
+            future.set_result(job.result())
+        else:
+            future.set_exception(error)
+        self._dispatch()
+    
+    def _expire(self, worker: _RenderWorker, future) -> None:
+        if not self._claim(worker, future):
+            return
+        
+        logger.warning(f"Render job timed out after {self.timeout}s, restarting its worker")
+        self._retire(worker, future)
+        future.set_exception(RenderTimeoutError("Render job timed out"))
+        self._dispatch()
+    
+    def submit(self, fn, *args) -> Future:
+        """
+        Queue fn(*args) and return a concurrent.futures.Future for it. The
+        future fails with RenderTimeoutError if the job runs too long.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RenderQueueFullError("Render queue is full")
+            self._pending += 1
+        
+        self.start()
+        future = Future()
+        future.add_done_callback(self._release)
+        with self._lock:
+            self._queue.append((future, fn, args))
+        self._dispatch()
+        return future
+    
+    async def run(self, fn, *args):
+        """
+        Submit fn(*args) and await its result without blocking the event loop.
+        Cancelling the caller drops the job if it has not started yet.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+render_pool = RenderPool(
+    workers=settings.RENDER_WORKERS,
+    queue_size=settings.RENDER_QUEUE_SIZE,
+    timeout=settings.RENDER_TIMEOUT_SECONDS
+)
+
+
+async def render_pdf(html_content: str, pdf_identifier: bytes | None = None, render_options: dict | None = None) -> bytes:
+    return await render_pool.run(html_to_pdf, html_content, pdf_identifier, render_options)
+
+
+async def render_template_pdf(
+    html_template: str,
+    data: dict,
+    template_id=None,
+    pdf_identifier: bytes | None = None,
+    render_options: dict | None = None
+) -> tuple[bytes, float]:
+    return await render_pool.run(render_document, html_template, data, template_id, pdf_identifier, render_options)
@@ -1,17 +1,32 @@
+import os
 import re
+import json
+import time
+import asyncio
+import hashlib
 import uuid
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from pdf2image import convert_from_bytes
-from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError, PDFSyntaxError
-from typing import List
+import anyio
+from typing import AsyncIterator, Iterator, List, Tuple
+from app.core.config import settings
+from app.core.metrics import timed_stage, OUTPUT_BYTES_TOTAL
+from app.utils.image_index import ImageIndex
 
 logger = logging.getLogger(__name__)
 
 IMAGES_DIR = Path("generated_images")
 IMAGES_DIR.mkdir(exist_ok=True)
 
-VALID_FILENAME_PATTERN = re.compile(r'^[a-f0-9]{8}_page_\d+\.png$')
+image_index = ImageIndex(IMAGES_DIR / "index.sqlite3")
+
+# Legacy random batch ids ("1a2b3c4d_page_1.png") and content-addressed
+# conversions ("<pdf sha256 prefix>_<dpi>_page_1.png").
+VALID_FILENAME_PATTERN = re.compile(r'^(?:[a-f0-9]{8}|[a-f0-9]{24}_\d+)_page_\d+\.(?:png|jpg)$')
+
+IMAGE_EXTENSIONS = {"PNG": "png", "JPEG": "jpg"}
 
 
 class PDFConversionError(Exception):
@@ -19,39 +34,257 @@ class PDFConversionError(Exception):
     pass
 
 
-def pdf_to_images(pdf_bytes: bytes, dpi: int = 150, format: str = "PNG") -> List[str]:
+_save_executor = ThreadPoolExecutor(max_workers=settings.RASTER_SAVE_THREADS, thread_name_prefix="raster-save")
+_raster_limiter = None
+
+
+def get_raster_limiter() -> anyio.CapacityLimiter:
     """
-    Convert PDF bytes to images and save them to disk.
-    Returns list of filenames.
-    
-    Raises:
-        PDFConversionError: If conversion fails
+    Limits how many conversions run at once in this replica. RASTER_THREADS
+    and RASTER_MAX_MEMORY_MB are split between them (see raster_share).
+    """
+    global _raster_limiter
+    if _raster_limiter is None:
+        _raster_limiter = anyio.CapacityLimiter(settings.RASTER_CONCURRENCY)
+    return _raster_limiter
+
+
+def raster_share(total: int) -> int:
+    """
+    One conversion's share of a replica-wide raster budget, so that
+    RASTER_CONCURRENCY conversions together stay within it.
+    """
+    return max(1, total // max(settings.RASTER_CONCURRENCY, 1))
+
+
+def image_file_path(filename: str) -> Path:
+    """
+    Files are sharded into 256 subdirectories by the first two hex digits
+    of their name, keeping every directory small as volume grows.
+    """
+    return IMAGES_DIR / filename[:2] / filename
+
+
+def _save_image(image, filepath: Path, format: str) -> None:
+    # Write then rename, so a concurrent request for the same conversion
+    # never serves a half-written file.
+    filepath.parent.mkdir(exist_ok=True)
+    tmp_path = filepath.with_name(f".{filepath.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}")
+    try:
+        image.save(str(tmp_path), format)
+        os.replace(tmp_path, filepath)
+    finally:
+        image.close()
+    size = filepath.stat().st_size
+    image_index.record(filepath.name, size)
+    OUTPUT_BYTES_TOTAL.inc(size, kind="image")
+
+
+def conversion_id(pdf_bytes: bytes, dpi: int) -> str:
+    return f"{hashlib.sha256(pdf_bytes).hexdigest()[:24]}_{dpi}"
+
+
+def _manifest_path(conversion: str, format: str) -> Path:
+    return image_file_path(f"{conversion}_{IMAGE_EXTENSIONS[format]}.json")
+
+
+def _load_manifest(conversion: str, format: str) -> List[str] | None:
+    """
+    Filenames of a finished identical conversion, if all pages still exist.
     """
     try:
-        images = convert_from_bytes(pdf_bytes, dpi=dpi)
-    except PDFInfoNotInstalledError:
+        with open(_manifest_path(conversion, format), 'r') as f:
+            filenames = json.load(f)["pages"]
+    except (OSError, ValueError, KeyError):
+        return None
+    if not all(image_file_path(filename).exists() for filename in filenames):
+        return None
+    # Refresh the age of reused pages so retention does not remove them
+    # right after they were handed out again.
+    image_index.touch(filenames + [_manifest_path(conversion, format).name])
+    return filenames
+
+
+def _write_manifest(conversion: str, format: str, filenames: List[str]) -> None:
+    path = _manifest_path(conversion, format)
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump({"pages": filenames}, f)
+    os.replace(tmp_path, path)
+    image_index.record(path.name, path.stat().st_size)
+
+
+def _raise_conversion_error(error: Exception):
+    from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError, PDFSyntaxError
+    
+    if isinstance(error, PDFInfoNotInstalledError):
         logger.error("Poppler is not installed or not in PATH")
         raise PDFConversionError("PDF conversion tool not available")
-    except PDFPageCountError:
+    if isinstance(error, PDFPageCountError):
         logger.error("Could not get page count from PDF")
         raise PDFConversionError("Invalid or corrupted PDF")
-    except PDFSyntaxError:
+    if isinstance(error, PDFSyntaxError):
         logger.error("PDF syntax error")
         raise PDFConversionError("Invalid PDF format")
-    except Exception as e:
-        logger.error(f"PDF conversion failed: {str(e)}")
-        raise PDFConversionError(f"PDF conversion failed: {str(e)}")
+    logger.error(f"PDF conversion failed: {str(error)}")
+    raise PDFConversionError(f"PDF conversion failed: {str(error)}")
+
+
+def _page_size_points(info: dict) -> tuple[float, float]:
+    match = re.match(r'\s*([\d.]+)\s*x\s*([\d.]+)', str(info.get("Page size", "")))
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    return 612.0, 792.0
+
+
+def pages_per_window(info: dict, dpi: int, max_memory_bytes: int) -> int:
+    """
+    How many pages can be decoded at once without exceeding max_memory_bytes.
+    A decoded page costs about 4 bytes per pixel, plus the PPM buffer
+    poppler hands to Pillow, so each page is counted twice.
+    """
+    width, height = _page_size_points(info)
+    page_bytes = int(width / 72 * dpi) * int(height / 72 * dpi) * 4 * 2
+    return max(1, max_memory_bytes // max(page_bytes, 1))
+
+
+def iter_pdf_images(
+    pdf_bytes: bytes,
+    dpi: int = 150,
+    format: str = "PNG",
+    max_memory_bytes: int | None = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Rasterize a PDF in windows of pages and save each page as soon as it
+    is decoded, yielding (page_number, filename) as pages complete.
+    Peak memory stays under max_memory_bytes (by default this conversion's
+    share of RASTER_MAX_MEMORY_MB) whatever the page count.
+    
+    Files are named after the PDF content hash and DPI, so converting the
+    same PDF again reuses the pages of the previous conversion.
     
-    batch_id = str(uuid.uuid4())[:8]
+    Raises:
+        PDFConversionError: If conversion fails
+    """
+    format = format.upper()
+    if format not in IMAGE_EXTENSIONS:
+        raise PDFConversionError(f"Unsupported image format: {format}")
+    extension = IMAGE_EXTENSIONS[format]
+    
+    conversion = conversion_id(pdf_bytes, dpi)
+    cached = _load_manifest(conversion, format)
+    if cached is not None:
+        for page_number, filename in enumerate(cached, start=1):
+            yield page_number, filename
+        return
+    
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    
+    max_memory_bytes = max_memory_bytes or raster_share(settings.RASTER_MAX_MEMORY_MB * 1024 * 1024)
     filenames = []
     
-    for i, image in enumerate(images):
-        filename = f"{batch_id}_page_{i + 1}.png"
-        filepath = IMAGES_DIR / filename
-        image.save(str(filepath), format)
-        filenames.append(filename)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "source.pdf")
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_bytes)
+        
+        try:
+            info = pdfinfo_from_path(pdf_path)
+            total_pages = int(info["Pages"])
+        except Exception as e:
+            _raise_conversion_error(e)
+        
+        window = pages_per_window(info, dpi, max_memory_bytes)
+        
+        for first_page in range(1, total_pages + 1, window):
+            last_page = min(first_page + window - 1, total_pages)
+            try:
+                images = convert_from_path(
+                    pdf_path,
+                    dpi=dpi,
+                    first_page=first_page,
+                    last_page=last_page,
+                    thread_count=raster_share(settings.RASTER_THREADS)
+                )
+            except Exception as e:
+                _raise_conversion_error(e)
+            
+            # PNG encoding runs in zlib with the GIL released, so pages of
+            # a window are encoded and written in parallel.
+            saves = []
+            for offset, image in enumerate(images):
+                page_number = first_page + offset
+                filename = f"{conversion}_page_{page_number}.{extension}"
+                future = _save_executor.submit(_save_image, image, image_file_path(filename), format)
+                saves.append((page_number, filename, future))
+            del images
+            
+            for page_number, filename, future in saves:
+                future.result()
+                filenames.append(filename)
+                yield page_number, filename
     
-    return filenames
+    _write_manifest(conversion, format, filenames)
+
+
+def pdf_to_images(pdf_bytes: bytes, dpi: int = 150, format: str = "PNG") -> List[str]:
+    """
+    Convert PDF bytes to images and save them to disk.
+    Returns list of filenames.
+    
+    Raises:
+        PDFConversionError: If conversion fails
+    """
+    return [filename for _, filename in iter_pdf_images(pdf_bytes, dpi=dpi, format=format)]
+
+
+def iter_ndjson_pages(pdf_bytes: bytes, base_url: str, dpi: int = 150, **extra) -> Iterator[bytes]:
+    """
+    NDJSON progress stream for the images endpoints: one line per page as
+    it is saved, then a final summary line (or an error line).
+    """
+    total_pages = 0
+    try:
+        for page_number, filename in iter_pdf_images(pdf_bytes, dpi=dpi):
+            total_pages += 1
+            line = {"page": page_number, "url": f"{base_url}/api/images/{filename}"}
+            yield (json.dumps(line) + "\n").encode('utf-8')
+    except PDFConversionError as e:
+        yield (json.dumps({"success": False, "error": str(e)}) + "\n").encode('utf-8')
+        return
+    
+    yield (json.dumps({"success": True, **extra, "total_pages": total_pages}) + "\n").encode('utf-8')
+
+
+async def pdf_to_images_async(pdf_bytes: bytes, dpi: int = 150, format: str = "PNG", template="") -> List[str]:
+    """
+    pdf_to_images run off the event loop, within the replica's raster limit.
+    """
+    async with get_raster_limiter():
+        with timed_stage("rasterize", template):
+            return await anyio.to_thread.run_sync(lambda: pdf_to_images(pdf_bytes, dpi=dpi, format=format))
+
+
+async def aiter_ndjson_pages(
+    pdf_bytes: bytes,
+    base_url: str,
+    dpi: int = 150,
+    template="",
+    **extra
+) -> AsyncIterator[bytes]:
+    """
+    Async version of iter_ndjson_pages holding a raster slot for the
+    whole conversion and stepping the conversion in a worker thread.
+    """
+    async with get_raster_limiter():
+        with timed_stage("rasterize", template):
+            pages = iter_ndjson_pages(pdf_bytes, base_url, dpi=dpi, **extra)
+            while True:
+                line = await anyio.to_thread.run_sync(next, pages, None)
+                if line is None:
+                    break
+                yield line
 
 
 def get_image_path(filename: str) -> Path | None:
@@ -64,26 +297,90 @@ def get_image_path(filename: str) -> Path | None:
     if not VALID_FILENAME_PATTERN.match(filename):
         return None
     
-    filepath = (IMAGES_DIR / filename).resolve()
-    
-    if not filepath.is_relative_to(IMAGES_DIR.resolve()):
-        return None
-    
-    if filepath.exists():
-        return filepath
+    images_root = IMAGES_DIR.resolve()
+    # Sharded location first, then the flat layout used by older versions.
+    for candidate in (image_file_path(filename), IMAGES_DIR / filename):
+        filepath = candidate.resolve()
+        if filepath.is_relative_to(images_root) and filepath.exists():
+            return filepath
     return None
 
 
-def cleanup_old_images(max_age_hours: int = 24):
+def _delete_indexed(entries: List[Tuple[str, int]]) -> int:
+    for name, _ in entries:
+        try:
+            image_file_path(name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete {name}: {str(e)}")
+    image_index.remove([name for name, _ in entries])
+    return sum(size for _, size in entries)
+
+
+def _cleanup_legacy_images(max_age_seconds: float) -> None:
+    # Pre-sharding files live directly in IMAGES_DIR and are not indexed;
+    # only that top level is scanned, never the shards.
+    current_time = time.time()
+    with os.scandir(IMAGES_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file() or not VALID_FILENAME_PATTERN.match(entry.name):
+                continue
+            if current_time - entry.stat().st_mtime > max_age_seconds:
+                os.unlink(entry.path)
+
+
+def cleanup_old_images(max_age_hours: int = 24, max_total_bytes: int | None = None, chunk_size: int = 1000) -> dict:
     """
-    Remove images older than max_age_hours.
+    Remove images older than max_age_hours, then the oldest images until
+    the total stays under max_total_bytes. Driven by the image index, so
+    the cost depends on the number of deleted files, not on the directory size.
     """
-    import time
-    
-    current_time = time.time()
     max_age_seconds = max_age_hours * 3600
+    cutoff = time.time() - max_age_seconds
+    deleted_files = 0
+    deleted_bytes = 0
+    
+    while True:
+        expired = image_index.older_than(cutoff, chunk_size)
+        if not expired:
+            break
+        deleted_bytes += _delete_indexed(expired)
+        deleted_files += len(expired)
+    
+    if max_total_bytes is not None:
+        excess = image_index.total_size() - max_total_bytes
+        while excess > 0:
+            oldest = image_index.oldest(chunk_size)
+            if not oldest:
+                break
+            victims = []
+            for name, size in oldest:
+                victims.append((name, size))
+                excess -= size
+                if excess <= 0:
+                    break
+            deleted_bytes += _delete_indexed(victims)
+            deleted_files += len(victims)
     
-    for filepath in IMAGES_DIR.glob("*.png"):
-        file_age = current_time - filepath.stat().st_mtime
-        if file_age > max_age_seconds:
-            filepath.unlink()
+    _cleanup_legacy_images(max_age_seconds)
+    
+    return {"deleted_files": deleted_files, "deleted_bytes": deleted_bytes}
+
+
+async def run_image_retention() -> None:
+    """
+    Background task enforcing IMAGE_MAX_AGE_HOURS and IMAGE_DISK_QUOTA_MB.
+    """
+    while True:
+        try:
+            result = await asyncio.to_thread(
+                cleanup_old_images,
+                settings.IMAGE_MAX_AGE_HOURS,
+                settings.IMAGE_DISK_QUOTA_MB * 1024 * 1024
+            )
+            if result["deleted_files"]:
+                logger.info(f"Image retention removed {result['deleted_files']} files ({result['deleted_bytes']} bytes)")
+        except Exception as e:
+            logger.error(f"Image retention failed: {str(e)}")
+        await asyncio.sleep(settings.IMAGE_RETENTION_INTERVAL_SECONDS)
@@ -0,0 +1,135 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# <link rel="stylesheet" href="shared:corporate"> pulls in
+# SHARED_STYLES_DIR/corporate.css as a pre-parsed stylesheet.
+SHARED_LINK_PATTERN = re.compile(
+    r'<link\b[^>]*\bhref\s*=\s*["\']shared:([A-Za-z0-9_.-]+)["\'][^>]*>',
+    re.IGNORECASE
+)
+
+# Anything through which a document can declare fonts of its own.
+OWN_FONTS_PATTERN = re.compile(r'@font-face|@import|<link\b', re.IGNORECASE)
+
+_font_config = None
+_stylesheets: dict[str, tuple[int, object]] = {}
+_lock = threading.Lock()
+
+
+def get_font_config():
+    """
+    FontConfiguration shared by every render in this process, so fonts
+    declared by shared stylesheets are registered only once. Only shared
+    stylesheets may add fonts to it; see extract_shared_styles.
+    """
+    global _font_config
+    
+    if _font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        with _lock:
+            if _font_config is None:
+                _font_config = FontConfiguration()
+    return _font_config
+
+
+def _style_path(name: str) -> str:
+    return os.path.join(settings.SHARED_STYLES_DIR, f"{name}.css")
+
+
+def _version(name: str) -> int | None:
+    try:
+        stat = os.stat(_style_path(name))
+    except OSError:
+        return None
+    return stat.st_mtime_ns ^ stat.st_size
+
+
+def get_stylesheet(name: str, font_config=None):
+    """
+    Parsed CSS object for a shared stylesheet, reparsed only when the file
+    changes. With a font_config other than the shared one it is parsed
+    fresh for that configuration and not cached. Returns None if it does
+    not exist.
+    """
+    from weasyprint import CSS
+    from app.utils.asset_fetcher import make_url_fetcher
+    
+    version = _version(name)
+    if version is None:
+        return None
+    
+    if font_config is None:
+        cached = _stylesheets.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    
+    path = _style_path(name)
+    stylesheet = CSS(
+        filename=path,
+        font_config=font_config or get_font_config(),
+        url_fetcher=make_url_fetcher(settings.ASSET_FETCH_BUDGET_SECONDS)
+    )
+    if font_config is None:
+        with _lock:
+            _stylesheets[name] = (version, stylesheet)
+    return stylesheet
+
+
+def extract_shared_styles(html_content: str) -> tuple[str, list, object]:
+    """
+    Remove shared: stylesheet links from the document and return the HTML,
+    the matching CSS objects in document order, and the FontConfiguration
+    to render with.
+    
+    A document that can declare fonts of its own gets a FontConfiguration
+    of its own, dropped after the render, so user @font-face rules neither
+    pile up in the shared one nor leak to other tenants' renders.
+    """
+    from weasyprint.text.fonts import FontConfiguration
+    
+    names = list(dict.fromkeys(SHARED_LINK_PATTERN.findall(html_content)))
+    html_content = SHARED_LINK_PATTERN.sub("", html_content)
+    font_config = FontConfiguration() if OWN_FONTS_PATTERN.search(html_content) else None
+    
+    stylesheets = []
+    for name in names:
+        stylesheet = get_stylesheet(name, font_config)
+        if stylesheet is None:
+            logger.warning(f"Shared stylesheet {name} not found")
+            continue
+        stylesheets.append(stylesheet)
+    return html_content, stylesheets, font_config or get_font_config()
+
+
+def styles_fingerprint(html_content: str) -> str:
+    """
+    Versions of the shared stylesheets a template references, for cache
+    keys: editing a shared stylesheet changes the rendered output.
+    """
+    names = sorted(set(SHARED_LINK_PATTERN.findall(html_content)))
+    if not names:
+        return ""
+    versions = ",".join(f"{name}:{_version(name)}" for name in names)
+    return hashlib.sha256(versions.encode('utf-8')).hexdigest()[:16]
+
+
+def preload_stylesheets() -> int:
+    """
+    Parse every stylesheet in SHARED_STYLES_DIR; used by render worker warm-up.
+    """
+    try:
+        filenames = os.listdir(settings.SHARED_STYLES_DIR)
+    except OSError:
+        return 0
+    
+    loaded = 0
+    for filename in filenames:
+        if filename.endswith(".css") and get_stylesheet(filename[:-4]) is not None:
+            loaded += 1
+    return loaded
@@ -0,0 +1,51 @@
+import zipfile
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Tuple
+
+
+class _ChunkSink:
+    """
+    Write-only file object collecting what ZipFile writes. It has no
+    tell(), so ZipFile switches to streaming mode with data descriptors.
+    """
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[Tuple[str, bytes]], compression: int = zipfile.ZIP_STORED) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of (filename, data) entries chunk by chunk, so the
+    archive never has to be held in memory as a whole.
+    PDFs are already compressed, hence ZIP_STORED by default.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as archive:
+        for filename, data in entries:
+            archive.writestr(filename, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+async def aiter_zip(entries: AsyncIterable[Tuple[str, bytes]], compression: int = zipfile.ZIP_STORED) -> AsyncIterator[bytes]:
+    """
+    iter_zip() for entries produced asynchronously: each entry is written
+    and sent as soon as it arrives.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as archive:
+        async for filename, data in entries:
+            archive.writestr(filename, data)
+            yield sink.drain()
+    yield sink.drain()
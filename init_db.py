@@ -4,10 +4,14 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.core.database import engine, Base
+from app.core.migrations import run_migrations
 from app.models.user import User
 from app.models.template import Template
 from app.models.apikey import APIKey
 from app.models.renderlog import RenderLog
+from app.models.renderlog_rollup import RenderLogRollup
+from app.models.renderjob import RenderJob
+from app.models.cache_invalidation import CacheInvalidation
 from app.core.security import get_password_hash
 from sqlalchemy.orm import Session
 
@@ -15,9 +19,31 @@ from sqlalchemy.orm import Session
 def init_database():
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print("Database tables created successfully!")
 
 
+def maintain_partitions():
+    from app.core.partitions import run_partition_maintenance
+    
+    print("Running render log partition maintenance...")
+    result = run_partition_maintenance(engine)
+    print(f"Created: {result['created'] or 'none'}; archived and dropped: {result['dropped'] or 'none'}")
+
+
+def rebuild_analytics():
+    from app.core.database import SessionLocal
+    from app.services.analytics_service import rebuild_rollups
+    
+    print("Rebuilding render analytics rollups...")
+    db = SessionLocal()
+    try:
+        processed = rebuild_rollups(db)
+        print(f"Rollups rebuilt from {processed} render logs.")
+    finally:
+        db.close()
+
+
 def create_admin_user(email: str = "admin@example.com", password: str = "admin123"):
     from app.core.database import SessionLocal
     
@@ -42,6 +68,12 @@ def create_admin_user(email: str = "admin@example.com", password: str = "admin12
 if __name__ == "__main__":
     init_database()
     
+    if "--partitions" in sys.argv:
+        maintain_partitions()
+    
+    if "--rebuild-rollups" in sys.argv:
+        rebuild_analytics()
+    
     if "--admin" in sys.argv:
         admin_email = os.environ.get("ADMIN_EMAIL", "admin@example.com")
         admin_password = os.environ.get("ADMIN_PASSWORD", "admin123")
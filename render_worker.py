@@ -0,0 +1,36 @@
+import os
+import sys
+import logging
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.user import User
+from app.models.template import Template
+from app.models.apikey import APIKey
+from app.models.renderlog import RenderLog
+from app.models.renderlog_rollup import RenderLogRollup
+from app.models.renderjob import RenderJob
+from app.models.cache_invalidation import CacheInvalidation
+
+
+def start_worker():
+    from app.services.job_service import run_worker
+    run_worker()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
+    processes = int(os.environ.get("JOB_WORKER_PROCESSES", "1"))
+    print(f"Starting {processes} render worker process(es)...")
+    
+    if processes <= 1:
+        start_worker()
+    else:
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=start_worker) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()